@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.contrib import admin
 
 from posts.models import Post, Group, Comment, Follow
+from posts.search import search_post_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -9,6 +11,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо LIKE по всей таблице
+        if not search_term:
+            return queryset, False
+        ids = search_post_ids(search_term, settings.SEARCH_ADMIN_LIMIT)
+        return queryset.filter(pk__in=ids), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("pk", "title", "slug", "description")
@@ -0,0 +1,257 @@
+"""JSON API для мобильных клиентов, версия 1.
+
+Ленты листаются курсором: в ответе есть ``next`` — токен следующей
+страницы для параметра ``cursor``. Ответы для всех зрителей одинаковы
+и получают ETag из поколений кэша (posts.cache), поэтому повторный
+запрос с ``If-None-Match`` отвечает 304, не читая ленту из базы. Лента
+подписок у каждого своя, её ETag считается по содержимому ответа.
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+
+from posts import follows
+from posts.cache import (FEED_SCOPE, fragment_version, group_scope,
+                         is_shared, post_scope, profile_scope)
+from posts.comments import COMMENT_ORDERING, reply_parent
+from posts.forms import CommentForm
+from posts.models import Follow, Group, Post, User
+from posts.paginator import MergedCursorPaginator
+from posts.timeline import TIMELINE_ORDERING, timeline_sources
+
+FEED_ORDERING = ('-pub_date', '-id')
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=DjangoJSONEncoder,
+                        json_dumps_params={'ensure_ascii': False,
+                                           'separators': (',', ':')})
+
+
+def error(detail, status):
+    return json_response({'detail': detail}, status=status)
+
+
+def api_view(methods, login_required=False):
+    """Допустимые методы, проверка входа и ошибки в виде JSON."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = error('Метод не поддерживается', 405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            if login_required and not request.user.is_authenticated:
+                return error('Нужна авторизация', 401)
+            try:
+                return view(request, *args, **kwargs)
+            except Http404:
+                return error('Не найдено', 404)
+        return wrapper
+    return decorator
+
+
+def scope_etag(scopes):
+    """ETag по поколениям кэша областей ``scopes(**kwargs)`` и параметрам
+    запроса. Без областей (объект не найден) или без общего кэша
+    ETag не ставится."""
+    def etag(request, *args, **kwargs):
+        if not is_shared():
+            return None
+        names = scopes(**kwargs)
+        if not names:
+            return None
+        return f'{fragment_version(*names)}:{request.GET.urlencode()}'
+    return etag
+
+
+def index_scopes():
+    return [FEED_SCOPE]
+
+
+def group_scopes(slug):
+    pk = Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    return [group_scope(pk)] if pk else []
+
+
+def profile_scopes(username):
+    pk = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    return [profile_scope(pk)] if pk else []
+
+
+def post_scopes(post_id):
+    return [post_scope(post_id)]
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'thumbnail': post.image_thumbnail_url or None,
+        'comment_count': post.comment_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'text': comment.text,
+        'created': comment.created,
+        'author': comment.author.username,
+        'parent': comment.parent_id,
+        'replies_count': comment.replies_count,
+    }
+
+
+def cursor_page(request, querysets, ordering, serialize):
+    """Страница после курсора по одной или нескольким лентам.
+
+    Ленты с одинаковым порядком ``ordering`` сливаются, курсор
+    указывает на последнюю выданную запись.
+    """
+    paginator = MergedCursorPaginator(querysets, settings.API_PAGE_SIZE,
+                                      ordering=ordering)
+    page = paginator.get_cursor_page(request.GET.get('cursor'))
+    return {
+        'results': [serialize(obj) for obj in page.object_list],
+        'next': page.next_cursor,
+    }
+
+
+@api_view(['GET'])
+@condition(etag_func=scope_etag(index_scopes))
+def index(request):
+    return json_response(cursor_page(
+        request, [Post.objects.feed()], FEED_ORDERING, serialize_post))
+
+
+@api_view(['GET'])
+@condition(etag_func=scope_etag(group_scopes))
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return json_response(cursor_page(
+        request, [group.posts.feed()], FEED_ORDERING, serialize_post))
+
+
+@api_view(['GET'])
+@condition(etag_func=scope_etag(profile_scopes))
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return json_response(cursor_page(
+        request, [author.posts.feed()], FEED_ORDERING, serialize_post))
+
+
+@api_view(['GET'], login_required=True)
+def follow_index(request):
+    data = cursor_page(request, timeline_sources(request.user),
+                       TIMELINE_ORDERING, serialize_post)
+    return conditional_json(request, data)
+
+
+@api_view(['GET'])
+@condition(etag_func=scope_etag(post_scopes))
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.feed(), pk=post_id)
+    return json_response(serialize_post(post))
+
+
+@api_view(['GET', 'POST'])
+def comments(request, post_id):
+    if request.method == 'POST':
+        return add_comment(request, post_id)
+    return comment_list(request, post_id=post_id)
+
+
+@condition(etag_func=scope_etag(post_scopes))
+def comment_list(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    return json_response(cursor_page(
+        request, [post.comments.select_related('author')],
+        COMMENT_ORDERING, serialize_comment))
+
+
+def add_comment(request, post_id):
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация', 401)
+    post = get_object_or_404(Post, pk=post_id)
+    data = request_data(request)
+    form = CommentForm(data)
+    if not form.is_valid():
+        return json_response({'errors': form.errors}, status=400)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    comment.parent = reply_parent(post, data.get('parent'))
+    with transaction.atomic():
+        comment.save()
+    return json_response(serialize_comment(comment), status=201)
+
+
+@api_view(['POST', 'DELETE'], login_required=True)
+def follow(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.method == 'DELETE':
+        Follow.objects.filter(author=author, user=request.user).delete()
+        return json_response({'following': False})
+    if author == request.user:
+        return error('Нельзя подписаться на себя', 400)
+    _, created = Follow.objects.get_or_create(author=author,
+                                              user=request.user)
+    return json_response({'following': True}, status=201 if created else 200)
+
+
+@api_view(['POST', 'DELETE'], login_required=True)
+def follow_many(request):
+    data = request_data(request)
+    if hasattr(data, 'getlist'):
+        usernames = data.getlist('authors')
+    else:
+        usernames = data.get('authors')
+    if not isinstance(usernames, list) or not all(
+            isinstance(name, str) for name in usernames):
+        return error('Нужен список имён авторов authors', 400)
+    if len(usernames) > settings.FOLLOW_BATCH_LIMIT:
+        return error(f'Не больше {settings.FOLLOW_BATCH_LIMIT} авторов '
+                     f'за запрос', 400)
+    if request.method == 'DELETE':
+        return json_response(
+            {'unfollowed': follows.unfollow(request.user, usernames)})
+    return json_response(
+        {'followed': follows.follow(request.user, usernames)})
+
+
+def request_data(request):
+    """Поля запроса из JSON-тела или обычной формы."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+    return request.POST
+
+
+def conditional_json(request, data):
+    """Ответ с ETag по содержимому, 304 если клиент его уже видел."""
+    response = json_response(data)
+    etag = quote_etag(hashlib.md5(response.content).hexdigest())
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        response = not_modified
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Cookie'])
+    return response
@@ -0,0 +1,16 @@
+from django.urls import path
+
+from posts import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', api.index, name='index'),
+    path('posts/<int:post_id>/', api.post_detail, name='post'),
+    path('posts/<int:post_id>/comments/', api.comments, name='comments'),
+    path('groups/<slug:slug>/posts/', api.group_posts, name='group'),
+    path('follow/posts/', api.follow_index, name='follow_index'),
+    path('follow/', api.follow_many, name='follow_many'),
+    path('users/<str:username>/posts/', api.profile, name='profile'),
+    path('users/<str:username>/follow/', api.follow, name='follow'),
+]
@@ -0,0 +1,205 @@
+"""Замеры задержки и числа SQL-запросов страниц posts/urls.py.
+
+``seed`` наполняет базу синтетическими данными через mixer, как
+фикстуры в tests/fixtures: у авторов постов и подписок степенное
+(Zipf) распределение популярности, часть постов с картинками, в текстах
+есть хэштеги и упоминания. ``measure`` запрашивает каждую страницу
+тестовым клиентом и считает p50/p99 задержки и медиану числа
+SQL-запросов (из заголовка Server-Timing, см. posts.metrics).
+``compare`` сравнивает результат с сохранённым базовым.
+
+Запускается командой ``manage.py benchmark`` на отдельной тестовой
+базе, рабочие данные не затрагиваются.
+"""
+import io
+import math
+import random
+import re
+import time
+
+from django.test import Client
+from django.urls import reverse
+from mixer.backend.django import mixer
+from PIL import Image
+
+from posts.models import Comment, Follow, Group, Post, Tag, User
+from posts.urls import urlpatterns
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+IMAGE_NAME = 'posts/benchmark.jpg'
+
+
+def zipf_weights(count, exponent=1.0):
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def pareto_degree(limit, shape=1.5, minimum=1):
+    """Число подписок пользователя: у большинства мало, у немногих
+    много."""
+    return min(limit, int(minimum / (1 - random.random()) ** (1 / shape)))
+
+
+def save_image(storage):
+    buffer = io.BytesIO()
+    Image.new('RGB', (960, 339), (120, 160, 200)).save(buffer, 'JPEG')
+    if storage.exists(IMAGE_NAME):
+        storage.delete(IMAGE_NAME)
+    return storage.save(IMAGE_NAME, buffer)
+
+
+def seed(users=200, groups=10, posts=2000, comments=4000,
+         image_ratio=0.2, seed=0):
+    """Создать синтетические данные, одинаковые при одном ``seed``."""
+    random.seed(seed)
+    mixer.faker.seed_instance(seed)
+    people = mixer.cycle(users).blend(
+        User, username=mixer.sequence('user{0}'))
+    communities = mixer.cycle(groups).blend(
+        Group, slug=mixer.sequence('group{0}'),
+        title=mixer.sequence('Группа {0}'))
+    popularity = zipf_weights(users)
+    image = save_image(Post._meta.get_field('image').storage)
+
+    def text():
+        words = mixer.faker.sentence(nb_words=12)
+        if random.random() < 0.3:
+            words += f' #tag{random.randrange(50)}'
+        if random.random() < 0.1:
+            words += f' @{random.choice(people).username}'
+        return words
+
+    published = mixer.cycle(posts).blend(
+        Post,
+        author=(author for author in random.choices(
+            people, popularity, k=posts)),
+        group=(random.choice(communities) if random.random() < 0.5
+               else None for _ in range(posts)),
+        image=(image if random.random() < image_ratio else ''
+               for _ in range(posts)),
+        text=(text() for _ in range(posts)),
+    )
+    mixer.cycle(comments).blend(
+        Comment,
+        post=(post for post in random.choices(
+            published, zipf_weights(posts), k=comments)),
+        author=(author for author in random.choices(people, k=comments)),
+        text=(mixer.faker.sentence() for _ in range(comments)),
+    )
+    pairs = set()
+    for user in people:
+        degree = pareto_degree(users - 1)
+        while degree:
+            author = random.choices(people, popularity)[0]
+            if author != user and (user.pk, author.pk) not in pairs:
+                pairs.add((user.pk, author.pk))
+                degree -= 1
+    by_pk = {user.pk: user for user in people}
+    pairs = sorted(pairs)
+    mixer.cycle(len(pairs)).blend(
+        Follow,
+        user=(by_pk[user] for user, _ in pairs),
+        author=(by_pk[author] for _, author in pairs),
+    )
+    return {'users': users, 'groups': groups, 'posts': posts,
+            'comments': comments, 'follows': len(pairs), 'seed': seed}
+
+
+def cases():
+    """Страницы для замера: имя, кто запрашивает и адрес.
+
+    Читатель подписан на самых популярных авторов, автор — самый
+    популярный пользователь.
+    """
+    author = User.objects.get(username='user0')
+    reader = User.objects.get(username='user1')
+    group = Group.objects.get(slug='group0')
+    post = author.posts.order_by('-pub_date').first()
+    tag = Tag.objects.order_by('pk').first()
+    post_kwargs = {'username': author.username, 'post_id': post.pk}
+    author_kwargs = {'username': author.username}
+    public = {
+        'index': reverse('index'),
+        'group': reverse('group', kwargs={'slug': group.slug}),
+        'search': reverse('search') + '?q=group',
+        'tag': reverse('tag', kwargs={'name': tag.name}),
+        'profile': reverse('profile', kwargs=author_kwargs),
+        'post': reverse('post', kwargs=post_kwargs),
+        'post_comments': reverse('post_comments', kwargs=post_kwargs),
+    }
+    result = {}
+    for name, url in public.items():
+        result[name] = [('guest', url), ('reader', url)]
+    result.update({
+        'metrics': [('guest', reverse('metrics'))],
+        'new_post': [('reader', reverse('new_post'))],
+        'follow_index': [('reader', reverse('follow_index'))],
+        'follow_many': [('reader', reverse('follow_many'))],
+        'post_edit': [('author', reverse('post_edit', kwargs=post_kwargs))],
+        'add_comment': [('reader',
+                         reverse('add_comment', kwargs=post_kwargs))],
+        'profile_follow': [('reader',
+                            reverse('profile_follow', kwargs=author_kwargs))],
+        'profile_unfollow': [('reader', reverse(
+            'profile_unfollow', kwargs=author_kwargs))],
+    })
+    missing = {pattern.name for pattern in urlpatterns} - set(result)
+    if missing:
+        raise ValueError(f'Нет замеров для страниц: {sorted(missing)}')
+    return result, {'author': author, 'reader': reader}
+
+
+def percentile(values, share):
+    """Значение не меньше доли ``share`` замеров (nearest rank)."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def measure(requests=30, warmup=2):
+    """p50/p99 задержки (мс) и медиана SQL-запросов по каждой странице."""
+    pages, users = cases()
+    clients = {'guest': Client()}
+    for role, user in users.items():
+        clients[role] = Client()
+        clients[role].force_login(user)
+    results = {}
+    for name, variants in pages.items():
+        for role, url in variants:
+            client = clients[role]
+            timings, queries = [], []
+            for number in range(warmup + requests):
+                started = time.perf_counter()
+                response = client.get(url)
+                elapsed = time.perf_counter() - started
+                if response.status_code not in (200, 302):
+                    raise ValueError(
+                        f'{url} ответил {response.status_code}')
+                if number >= warmup:
+                    timings.append(elapsed * 1000)
+                    queries.append(int(QUERIES.search(
+                        response['Server-Timing']).group(1)))
+            results[f'{name} [{role}]'] = {
+                'p50_ms': round(percentile(timings, 0.5), 2),
+                'p99_ms': round(percentile(timings, 0.99), 2),
+                'queries': percentile(queries, 0.5),
+            }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Регрессии относительно ``baseline``: больше SQL-запросов или
+    медиана задержки выше базовой больше чем в ``tolerance`` раз.
+    Страница без базового замера тоже считается регрессией."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            regressions.append(f'{name}: нет в базовом замере')
+            continue
+        if current['queries'] > base['queries']:
+            regressions.append(
+                f'{name}: запросов {base["queries"]} -> '
+                f'{current["queries"]}')
+        if current['p50_ms'] > base['p50_ms'] * tolerance:
+            regressions.append(
+                f'{name}: p50 {base["p50_ms"]} -> {current["p50_ms"]} мс')
+    return regressions
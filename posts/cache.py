@@ -0,0 +1,122 @@
+"""Версии (поколения) кэша страниц.
+
+Каждая область — общая лента, группа, профиль, пост — имеет счётчик
+поколения. Он входит в ключи фрагментов и увеличивается сигналами при
+изменении постов, комментариев и групп: старые фрагменты перестают
+читаться сразу, а вытесняются из кэша уже сами.
+
+Счётчики должны быть общими для всех процессов сайта, поэтому кэш в
+памяти процесса годится только для одного процесса (``is_shared``,
+проверки posts.checks).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+GENERATION_KEY = 'generation:{}'
+CHANGED_KEY = 'changed:{}'
+FEED_SCOPE = 'feed'
+# Названия групп выводятся во всех лентах, поэтому правка группы
+# сбрасывает все области разом.
+GROUPS_SCOPE = 'groups'
+# Рекомендации «кого читать» пересобираются разом, см. posts.suggestions
+SUGGESTIONS_SCOPE = 'suggestions'
+
+
+def is_process_local():
+    """Хранится ли кэш в памяти процесса."""
+    backend = settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND']
+    return issubclass(import_string(backend), LocMemCache)
+
+
+def is_shared():
+    """Видят ли все процессы сайта одни и те же поколения."""
+    return settings.WEB_CONCURRENCY == 1 or not is_process_local()
+
+
+def _initial_generation():
+    # Поколение, потерянное при вытеснении из кэша, начинается заново
+    # с метки времени, то есть больше любого прежнего значения.
+    return int(time.time() * 1000)
+
+
+def generations(*scopes):
+    """Текущие поколения областей одним обращением к кэшу."""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _initial_generation(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def fragment_version(*scopes):
+    """Строка версии фрагмента для тега ``{% cache %}``."""
+    return '.'.join(map(str, generations(*scopes, GROUPS_SCOPE)))
+
+
+def changed_at(*scopes):
+    """Время последнего изменения областей (Unix time).
+
+    Для области, отметка которой потеряна, им считается текущий момент.
+    """
+    keys = [CHANGED_KEY.format(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time(), None)
+            values[key] = cache.get(key)
+    return max(values.values())
+
+
+def bump(*scopes):
+    """Сделать устаревшими все фрагменты перечисленных областей."""
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), None)
+    now = time.time()
+    cache.set_many({CHANGED_KEY.format(scope): now for scope in scopes}, None)
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def profile_scope(author_id):
+    return f'profile:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def stats_scope(user_id):
+    # Счётчики профиля и подписки: выводятся в профиле и на странице
+    # поста, но не входят в кэшируемые фрагменты.
+    return f'stats:{user_id}'
+
+
+def bump_post(post_id, author_id, *group_ids):
+    """Сбросить фрагменты всех страниц, где показывается пост."""
+    scopes = [FEED_SCOPE, profile_scope(author_id), post_scope(post_id)]
+    scopes += [group_scope(pk) for pk in set(group_ids) if pk is not None]
+    bump(*scopes)
+
+
+def viewer_key(user, posts):
+    """Часть ключа фрагмента, зависящая от зрителя.
+
+    От зрителя зависит только кнопка редактирования, поэтому отдельная
+    копия фрагмента нужна лишь автору одного из показанных постов.
+    """
+    if user.is_authenticated and any(
+            post.author_id == user.pk for post in posts):
+        return user.pk
+    return ''
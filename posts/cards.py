@@ -0,0 +1,49 @@
+"""Кэш отрисованных карточек постов (include/post_item.html).
+
+Карточка не зависит от зрителя и хранится под ключом из id поста и
+версии его содержимого, страница ленты собирается одним get_many.
+Кнопка редактирования для автора подставляется поверх готовой
+карточки вместо метки EDIT_BUTTON_MARK.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.hashtags import mentioned_usernames
+
+CARD_KEY = 'post_card:{}:{}:{}'
+EDIT_BUTTON_MARK = '<!-- post-edit-button -->'
+
+
+def card_key(post, comment_link):
+    return CARD_KEY.format(post.pk, post.card_version, int(comment_link))
+
+
+def render_cards(posts, viewer=None, comment_link=True):
+    """HTML карточек постов в порядке ``posts``."""
+    posts = list(posts)
+    keys = [card_key(post, comment_link) for post in posts]
+    cards = cache.get_many(keys)
+    render = [(key, post) for key, post in zip(keys, posts)
+              if key not in cards]
+    mentioned = mentioned_usernames(post for _, post in render)
+    missing = {}
+    for key, post in render:
+        missing[key] = render_to_string('include/post_item.html', {
+            'post': post, 'comment_link': comment_link,
+            'mentioned': mentioned.get(post.pk, ()),
+            'edit_button_mark': mark_safe(EDIT_BUTTON_MARK),
+        })
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    viewer_id = getattr(viewer, 'pk', None)
+    html = []
+    for key, post in zip(keys, posts):
+        card = cards[key]
+        if viewer_id is not None and post.author_id == viewer_id:
+            card = card.replace(EDIT_BUTTON_MARK, render_to_string(
+                'include/post_edit_button.html', {'post': post}), 1)
+        html.append(card)
+    return mark_safe(''.join(html))
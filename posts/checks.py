@@ -0,0 +1,32 @@
+"""Системные проверки настроек кэша.
+
+Поколения кэша (posts.cache) задают ETag, версии фрагментов и выбор
+реплики, поэтому должны быть общими для всех процессов сайта.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from posts import cache
+
+HINT = 'Выберите общий кэш: YATUBE_CACHE=sqlite.'
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if cache.is_shared():
+        return []
+    return [Error(
+        'Кэш в памяти процесса не годится для нескольких процессов '
+        f'(WEB_CONCURRENCY={settings.WEB_CONCURRENCY}).',
+        hint=HINT, id='posts.E001',
+    )]
+
+
+@register(Tags.caches, deploy=True)
+def check_deploy_cache(app_configs, **kwargs):
+    if settings.DEBUG or not cache.is_process_local():
+        return []
+    return [Error(
+        'Кэш в памяти процесса не годится для работы без DEBUG.',
+        hint=HINT, id='posts.E002',
+    )]
@@ -0,0 +1,107 @@
+"""Комментарии к посту: ветки ответов и постраничный вывод.
+
+Ветки хранятся материализованным путём: ``path`` комментария — путь
+родителя плюс сегмент из ``PATH_STEP`` цифр его ключа. У корневых
+комментариев ключ в сегменте обращён (``ROOT_KEY - pk``), поэтому
+сортировка по ``path`` сразу даёт порядок страницы: новые ветки
+сверху, ответы внутри ветки по порядку, каждый под своим родителем.
+Страница комментариев поста и любое поддерево читаются одним запросом
+по индексу (post, path) без рекурсии.
+
+Ответы глубже ``COMMENTS_MAX_DEPTH`` прикрепляются к предку на
+предельной глубине. На странице видно ``COMMENTS_THREAD_DEPTH``
+уровней, более глубокие ответы свёрнуты в ссылку «Ещё N ответов»
+со счётчиком ``replies_count`` и открываются отдельно (``?thread=``).
+
+Страница поста показывает первые ``COMMENTS_PER_PAGE`` комментариев,
+остальные подгружаются кнопкой «Показать ещё» по курсору: обычной
+ссылкой ``?comments=<курсор>`` или JSON-фрагментом (views.post_comments)
+без перезагрузки страницы. Авторы читаются тем же запросом.
+"""
+from django.conf import settings
+
+from posts.paginator import CursorPaginator
+
+COMMENT_ORDERING = ('-created', '-id')
+THREAD_ORDERING = ('path',)
+PATH_STEP = 10
+ROOT_KEY = 10 ** PATH_STEP - 1
+# Символ сразу после цифр: верхняя граница диапазона путей поддерева.
+# Диапазон и сортировка по path верны только при побайтном сравнении
+# строк; в PostgreSQL колонке задано правило сортировки "C" (миграция
+# 0018), иначе локаль базы расставила бы пути по-своему.
+PATH_END = ':'
+
+
+def root_segment(pk):
+    return f'{ROOT_KEY - pk:0{PATH_STEP}d}'
+
+
+def child_path(parent_path, pk):
+    return f'{parent_path}{pk:0{PATH_STEP}d}'
+
+
+def path_ids(path):
+    """Ключи комментариев на пути от корня ветки."""
+    segments = [int(path[start:start + PATH_STEP])
+                for start in range(0, len(path), PATH_STEP)]
+    if segments:
+        segments[0] = ROOT_KEY - segments[0]
+    return segments
+
+
+def place(comment):
+    """Путь и глубина только что сохранённого комментария."""
+    parent = comment.parent
+    if parent is None:
+        return root_segment(comment.pk), 0
+    return child_path(parent.path, comment.pk), parent.depth + 1
+
+
+def reply_parent(post, parent_id):
+    """Комментарий поста, под которым окажется ответ на ``parent_id``.
+
+    Ответ на слишком глубокий комментарий уходит к его предку на
+    глубине ``COMMENTS_MAX_DEPTH - 1``; чужой или неизвестный
+    ``parent_id`` даёт комментарий верхнего уровня.
+    """
+    try:
+        parent_id = int(parent_id)
+    except (TypeError, ValueError):
+        return None
+    parent = post.comments.filter(pk=parent_id).first()
+    if parent is None or parent.depth < settings.COMMENTS_MAX_DEPTH:
+        return parent
+    ancestor = path_ids(parent.path)[settings.COMMENTS_MAX_DEPTH - 1]
+    return post.comments.get(pk=ancestor)
+
+
+def thread_root(post, thread_id):
+    """Комментарий поста, ветку которого нужно показать, или None."""
+    try:
+        return post.comments.filter(pk=int(thread_id)).first()
+    except (TypeError, ValueError):
+        return None
+
+
+def comment_page(post, cursor=None, root=None):
+    """Ленивая страница комментариев поста после ``cursor``.
+
+    Без ``root`` — все ветки поста, с ``root`` — его поддерево. В обоих
+    случаях видно ``COMMENTS_THREAD_DEPTH`` уровней.
+    """
+    comments = post.comments.select_related('author')
+    depth = settings.COMMENTS_THREAD_DEPTH - 1
+    if root is not None:
+        comments = comments.filter(path__gte=root.path,
+                                   path__lt=root.path + PATH_END)
+        depth += root.depth
+    paginator = CursorPaginator(comments.filter(depth__lte=depth),
+                                settings.COMMENTS_PER_PAGE,
+                                ordering=THREAD_ORDERING)
+    page = paginator.get_lazy_cursor_page(cursor)
+    page.root = root
+    # Глубина, на которой ответы сворачиваются, и сдвиг отступов ветки
+    page.last_depth = depth
+    page.depth_offset = -root.depth if root is not None else 0
+    return page
@@ -0,0 +1,87 @@
+"""Условные ответы (304) для публичных страниц.
+
+ETag и Last-Modified страницы считаются без отрисовки шаблонов: по
+поколениям и отметкам изменения областей кэша (posts.cache), которые
+сигналы обновляют при любой записи, включая правки и удаления. Для
+авторизованных пользователей ETag включает пользователя и его
+CSRF-cookie, а ответ помечается как ``private``. Анонимным посетителям
+страница отдаётся из кэша целых страниц (posts.pagecache). Недавно
+изменённые страницы собираются по основной базе, а не по реплике
+(posts.replicas). Без общего кэша (``posts.cache.is_shared``) поколения
+у процессов разные, и страницы отдаются как обычно, без валидаторов.
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from posts import pagecache
+from posts.cache import GROUPS_SCOPE, changed_at, generations, is_shared
+from posts.replicas import primary_if_changed
+
+
+def validators(request, scopes):
+    """ETag и Last-Modified страницы, показывающей области ``scopes``."""
+    scopes = [*scopes, GROUPS_SCOPE]
+    parts = [*generations(*scopes), request.GET.urlencode()]
+    if request.user.is_authenticated:
+        parts += [request.user.pk,
+                  request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')]
+    etag = hashlib.md5(repr(parts).encode()).hexdigest()
+    return quote_etag(etag), int(changed_at(*scopes))
+
+
+def conditional_page(scopes_for, viewer_scopes=None):
+    """Отвечать 304 на GET, если страница не менялась.
+
+    ``scopes_for(**kwargs)`` по аргументам view возвращает области кэша,
+    из которых собрана страница, или None, если объекта нет: тогда
+    view вызывается как обычно и сам отвечает 404.
+    ``viewer_scopes(user, **kwargs)`` добавляет области частей страницы,
+    которые видны не всем зрителям.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not is_shared():
+                return view(request, *args, **kwargs)
+            scopes = scopes_for(**kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            if viewer_scopes is not None:
+                scopes += viewer_scopes(request.user, **kwargs)
+            etag, last_modified = validators(request, scopes)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                with primary_if_changed(last_modified):
+                    response = render(request, view, args, kwargs, etag,
+                                      http_date(last_modified))
+            if response.status_code in (200, 304):
+                # У устаревшей копии из кэша страниц заголовки свои
+                response.setdefault('ETag', etag)
+                response.setdefault('Last-Modified',
+                                    http_date(last_modified))
+                cache_control(request, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def render(request, view, args, kwargs, etag, last_modified):
+    if request.user.is_authenticated or not settings.PAGE_CACHE_TIMEOUT:
+        return view(request, *args, **kwargs)
+    return pagecache.fetch(request, etag, last_modified,
+                           lambda: view(request, *args, **kwargs))
+
+
+def cache_control(request, response):
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True,
+                            max_age=settings.PUBLIC_PAGE_MAX_AGE)
+    patch_vary_headers(response, ['Cookie'])
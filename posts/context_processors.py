@@ -1,7 +1,15 @@
 import datetime as dt
 
+from django.conf import settings
+
 
 def year(request):
     return {
         'year': dt.datetime.now().year
     }
+
+
+def cache_timeout(request):
+    return {
+        'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT
+    }
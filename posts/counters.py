@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Post, ProfileStats, User
+
+
+def count_of(queryset, field, outer):
+    """Коррелированный подзапрос COUNT(*) по ``field = outer``."""
+    counts = queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+        field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def actual_counters():
+    """Фактические значения счётчиков для ProfileStats и Post."""
+    return {
+        ProfileStats: {
+            'posts_count': count_of(Post.objects.all(), 'author', 'user'),
+            'followers_count': count_of(
+                Follow.objects.filter(user__isnull=False), 'author', 'user'),
+            'following_count': count_of(
+                Follow.objects.filter(author__isnull=False), 'user', 'user'),
+        },
+        Post: {
+            'comment_count': count_of(Comment.objects.all(), 'post', 'pk'),
+        },
+    }
+
+
+def drifted(model, counters):
+    """Записи, у которых хранимые счётчики расходятся с фактическими."""
+    condition = Q()
+    for name in counters:
+        condition |= ~Q(**{name: F(f'actual_{name}')})
+    return model.objects.annotate(**{
+        f'actual_{name}': value for name, value in counters.items()
+    }).filter(condition).order_by('pk').values_list('pk', flat=True)
+
+
+def recount(dry_run=False, batch_size=500):
+    """Найти и исправить расхождения счётчиков.
+
+    Исправление идёт пачками по ``batch_size`` записей: один UPDATE
+    с подзапросами на пачку. Возвращает число исправленных записей
+    по каждой модели.
+    """
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True)
+    report = {'missing': missing.count()}
+    if not dry_run:
+        ProfileStats.objects.bulk_create(
+            (ProfileStats(user_id=pk) for pk in missing.iterator()),
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+    for model, counters in actual_counters().items():
+        pks = list(drifted(model, counters))
+        report[model._meta.model_name] = len(pks)
+        if dry_run:
+            continue
+        for start in range(0, len(pks), batch_size):
+            with transaction.atomic():
+                model.objects.filter(
+                    pk__in=pks[start:start + batch_size]).update(**counters)
+    return report
@@ -0,0 +1,147 @@
+"""Подписки пачками: онбординг («подписаться на рекомендованных») и
+импорт графа подписок из CSV.
+
+Пачка подписок записывается одним ``bulk_create(ignore_conflicts=True)``,
+пачка отписок — DELETE по множеству пар, по ``PAIRS_PER_QUERY`` пар
+(posts.timeline) за запрос. Сигналы Follow при этом не срабатывают,
+поэтому счётчики профилей, ленты подписок и поколения кэша правятся
+здесь же и тоже по множествам: число запросов не растёт с каждой
+подпиской в пачке.
+"""
+import csv
+from collections import Counter, defaultdict
+
+from django.db import router, transaction
+from django.db.models import F
+
+from posts import cache, timeline
+from posts.models import Follow, ProfileStats, User
+
+
+def bump_counts(field, counts):
+    """Прибавить к счётчику ``field`` профилей свои величины из
+    ``counts`` ({user_id: delta}): один UPDATE на каждую величину."""
+    by_delta = defaultdict(list)
+    for user_id, delta in counts.items():
+        by_delta[delta].append(user_id)
+    if any(delta > 0 for delta in by_delta):
+        ProfileStats.objects.bulk_create(
+            (ProfileStats(user_id=user_id) for user_id in counts),
+            ignore_conflicts=True)
+    for delta, users in by_delta.items():
+        ProfileStats.objects.filter(user_id__in=users).update(
+            **{field: F(field) + delta})
+
+
+def apply_counters(pairs, sign):
+    bump_counts('following_count',
+                {user: sign * n for user, n in
+                 Counter(user for user, _ in pairs).items()})
+    followers = {author: sign * n for author, n in
+                 Counter(author for _, author in pairs).items()}
+    bump_counts('followers_count', followers)
+    timeline.rebalance(followers)
+
+
+def bump_stats_scopes(pairs):
+    users = {user for pair in pairs for user in pair}
+    cache.bump(*(cache.stats_scope(user) for user in users))
+
+
+def existing(pairs):
+    found = set()
+    for condition in timeline.pairs_filters(pairs):
+        found.update(Follow.objects.filter(condition).values_list(
+            'user_id', 'author_id'))
+    return found
+
+
+def follow_pairs(pairs):
+    """Создать подписки из пар (user_id, author_id), возвращает число
+    новых. Подписки на себя и уже существующие пропускаются."""
+    pairs = {(user, author) for user, author in pairs if user != author}
+    if not pairs:
+        return 0
+    with transaction.atomic():
+        created = pairs - existing(pairs)
+        Follow.objects.bulk_create(
+            (Follow(user_id=user, author_id=author)
+             for user, author in created),
+            ignore_conflicts=True)
+        apply_counters(created, 1)
+        timeline.backfill_many(created)
+    bump_stats_scopes(created)
+    return len(created)
+
+
+def unfollow_pairs(pairs):
+    """Удалить подписки из пар (user_id, author_id), возвращает число
+    удалённых."""
+    pairs = set(pairs)
+    if not pairs:
+        return 0
+    with transaction.atomic():
+        deleted = existing(pairs)
+        for condition in timeline.pairs_filters(deleted):
+            # Без сигналов: счётчики и ленты правятся ниже по всей пачке
+            Follow.objects.filter(condition)._raw_delete(
+                router.db_for_write(Follow))
+        apply_counters(deleted, -1)
+        timeline.prune_many(deleted)
+    bump_stats_scopes(deleted)
+    return len(deleted)
+
+
+def author_ids(usernames):
+    """Ключи существующих пользователей по именам из ``usernames``."""
+    return list(User.objects.filter(username__in=set(usernames)).values_list(
+        'pk', flat=True))
+
+
+def follow(user, usernames):
+    return follow_pairs(
+        (user.pk, author) for author in author_ids(usernames))
+
+
+def unfollow(user, usernames):
+    return unfollow_pairs(
+        (user.pk, author) for author in author_ids(usernames))
+
+
+def csv_batches(lines, batch_size):
+    """Пары имён «подписчик, автор» из CSV пачками по ``batch_size``."""
+    batch = []
+    for row in csv.reader(lines):
+        row = [value.strip() for value in row]
+        if not any(row):
+            continue
+        batch.append((row[0], row[1] if len(row) > 1 else ''))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_csv(lines, unfollow=False, batch_size=1000, progress=None):
+    """Подписки (или отписки) из CSV со столбцами «подписчик, автор».
+
+    Имена пачки переводятся в ключи одним запросом, пачка записывается
+    одной транзакцией. Строки с неизвестными пользователями, в том
+    числе строка заголовка, пропускаются. Возвращает число изменённых
+    подписок и пропущенных строк.
+    """
+    apply = unfollow_pairs if unfollow else follow_pairs
+    progress = progress or (lambda done, changed, skipped: None)
+    done = changed = skipped = 0
+    for batch in csv_batches(lines, batch_size):
+        names = {name for pair in batch for name in pair}
+        ids = dict(User.objects.filter(username__in=names).values_list(
+            'username', 'pk'))
+        pairs = [(ids[user], ids[author]) for user, author in batch
+                 if user in ids and author in ids]
+        changed += apply(pairs)
+        skipped += len(batch) - len(pairs)
+        done += len(batch)
+        progress(done, changed, skipped)
+    return changed, skipped
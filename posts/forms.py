@@ -1,4 +1,5 @@
 from django import forms
+from django.conf import settings
 
 from posts.models import Post, Comment
 
@@ -10,6 +11,22 @@ class PostForm(forms.ModelForm):
         widgets = {
             'text': forms.Textarea(attrs={'cols': 50, 'rows': 10})}
 
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        # Ошибки, из-за которых posts.uploads не принял файл
+        self.upload_errors = upload_errors or {}
+        super().__init__(*args, **kwargs)
+
+    def clean_image(self):
+        if 'image' in self.upload_errors:
+            raise forms.ValidationError(self.upload_errors['image'])
+        image = self.cleaned_data['image']
+        # Проверка на случай файлов, пришедших в обход обработчика загрузок
+        dimensions = getattr(getattr(image, 'image', None), 'size', None)
+        if dimensions and (dimensions[0] * dimensions[1]
+                           > settings.POST_IMAGE_MAX_PIXELS):
+            raise forms.ValidationError('Слишком большое разрешение картинки.')
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
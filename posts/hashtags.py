@@ -0,0 +1,106 @@
+"""Хэштеги (#тег) и упоминания (@username) в текстах постов.
+
+Разбор текста идёт при каждом сохранении поста (posts.signals), итог
+хранится в таблицах PostTag и Mention с продублированной датой поста:
+ленты тегов читаются по индексу (тег, дата) без просмотра текстов.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
+
+from posts.models import Mention, Post, PostTag, Tag, User
+
+TAG = re.compile(r'(?<![\w#])#(\w+)')
+MENTION = re.compile(r'(?<![\w@])@(\w[\w.+-]*\w|\w)')
+TOKEN = re.compile(f'{TAG.pattern}|{MENTION.pattern}')
+
+
+def extract_tags(text):
+    """Имена хэштегов текста без повторов, в нижнем регистре."""
+    names = (name.lower()[:Tag.MAX_LENGTH] for name in TAG.findall(text))
+    return list(dict.fromkeys(names))
+
+
+def extract_mentions(text):
+    return list(dict.fromkeys(MENTION.findall(text)))
+
+
+def sync_links(model, post, field, ids):
+    """Привести связи поста в ``model`` к набору ``ids``."""
+    links = model.objects.filter(post=post)
+    links.exclude(**{f'{field}__in': ids}).delete()
+    model.objects.bulk_create(
+        (model(post=post, pub_date=post.pub_date, **{field: pk})
+         for pk in ids),
+        ignore_conflicts=True,
+    )
+
+
+def tag_ids(names):
+    if not names:
+        return []
+    Tag.objects.bulk_create((Tag(name=name) for name in names),
+                            ignore_conflicts=True)
+    return list(Tag.objects.filter(name__in=names).values_list(
+        'pk', flat=True))
+
+
+def update_post(post):
+    """Пересобрать теги и упоминания поста по его тексту."""
+    mentioned = User.objects.filter(
+        username__in=extract_mentions(post.text)).values_list(
+        'pk', flat=True)
+    with transaction.atomic():
+        sync_links(PostTag, post, 'tag_id', tag_ids(extract_tags(post.text)))
+        sync_links(Mention, post, 'user_id', list(mentioned))
+
+
+def tag_feed(tag):
+    """Посты с тегом, новые сверху, в порядке индекса PostTag."""
+    return Post.objects.feed().filter(tag_links__tag=tag).annotate(
+        tag_date=F('tag_links__pub_date'),
+        tag_post=F('tag_links__post_id'),
+    )
+
+
+TAG_FEED_ORDERING = ('-tag_date', '-tag_post')
+
+
+def mentioned_usernames(posts):
+    """Имена упомянутых пользователей по ключам постов: одним запросом
+    и только если в текстах есть упоминания."""
+    usernames = {}
+    post_ids = [post.pk for post in posts if MENTION.search(post.text)]
+    if not post_ids:
+        return usernames
+    for post_id, username in Mention.objects.filter(
+            post_id__in=post_ids).values_list('post_id', 'user__username'):
+        usernames.setdefault(post_id, set()).add(username)
+    return usernames
+
+
+def linkify(text, usernames=()):
+    """Экранированный текст со ссылками на теги и профили.
+
+    Ссылками становятся только упоминания из ``usernames`` —
+    существующих пользователей, остальные остаются текстом.
+    """
+    html = []
+    position = 0
+    for match in TOKEN.finditer(text):
+        tag, username = match.groups()
+        if tag:
+            url = reverse('tag', args=[tag.lower()[:Tag.MAX_LENGTH]])
+        elif username in usernames:
+            url = reverse('profile', args=[username])
+        else:
+            continue
+        html.append(escape(text[position:match.start()]))
+        html.append(format_html('<a href="{}">{}</a>', url, match.group(0)))
+        position = match.end()
+    html.append(escape(text[position:]))
+    return mark_safe(''.join(html))
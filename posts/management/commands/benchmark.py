@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (override_settings, setup_databases,
+                               teardown_databases)
+
+from posts.benchmark import compare, measure, seed
+
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'posts.metrics.MeteredLocMemCache',
+        'LOCATION': 'benchmark',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку и число SQL-запросов всех страниц на '
+            'синтетических данных и сравнивает с базовым замером')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=4000)
+        parser.add_argument('--image-ratio', type=float, default=0.2,
+                            help='Доля постов с картинками')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=30,
+                            help='Сколько раз запрашивать каждую страницу')
+        parser.add_argument(
+            '--baseline', default=settings.BENCHMARK_BASELINE,
+            help='Файл базового замера')
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Сохранить результат как новый базовый замер')
+        parser.add_argument(
+            '--tolerance', type=float, default=2.0,
+            help='Во сколько раз p50 может превысить базовый')
+
+    def handle(self, *args, **options):
+        sizes = {name: options[name] for name in (
+            'users', 'groups', 'posts', 'comments', 'seed')}
+        if options['users'] < 2 or options['groups'] < 1:
+            raise CommandError('Нужны хотя бы два пользователя и группа')
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            with tempfile.TemporaryDirectory() as media, override_settings(
+                    MEDIA_ROOT=media, CACHES=BENCHMARK_CACHES,
+                    METRICS_SERVER_TIMING=True, THUMBNAIL_ASYNC=False,
+                    # Страницы гостей иначе отдавались бы из кэша
+                    # страниц, и замер не видел бы их отрисовку.
+                    PAGE_CACHE_TIMEOUT=0):
+                self.stdout.write('Наполнение базы...')
+                dataset = seed(image_ratio=options['image_ratio'], **sizes)
+                self.stdout.write(
+                    ', '.join(f'{key}: {value}'
+                              for key, value in dataset.items()))
+                results = measure(requests=options['requests'])
+        finally:
+            teardown_databases(databases, verbosity=0)
+        self.report(results)
+        self.check_baseline(options, sizes, results)
+
+    def report(self, results):
+        width = max(map(len, results))
+        self.stdout.write(
+            f'{"страница":<{width}}  {"p50, мс":>8}  {"p99, мс":>8}  '
+            f'{"SQL":>4}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<{width}}  {result["p50_ms"]:>8.2f}  '
+                f'{result["p99_ms"]:>8.2f}  {result["queries"]:>4}')
+
+    def check_baseline(self, options, sizes, results):
+        path = options['baseline']
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({'dataset': sizes, 'results': results}, file,
+                          ensure_ascii=False, indent=2, sort_keys=True)
+                file.write('\n')
+            self.stdout.write(self.style.SUCCESS(
+                f'Базовый замер сохранён в {path}'))
+            return
+        if not os.path.exists(path):
+            self.stdout.write(self.style.WARNING(
+                'Базового замера нет, сохраните его с --save-baseline'))
+            return
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline['dataset'] != sizes:
+            self.stdout.write(self.style.WARNING(
+                'Базовый замер снят на других данных '
+                f'({baseline["dataset"]}), сравнение пропущено'))
+            return
+        regressions = compare(results, baseline['results'],
+                              options['tolerance'])
+        if regressions:
+            raise CommandError(
+                'Регрессии производительности (новые страницы добавьте в '
+                'базовый замер с --save-baseline):\n'
+                + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
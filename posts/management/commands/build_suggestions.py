@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.suggestions import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации «кого читать» по графу подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count', type=int, default=None,
+            help='Сколько рекомендаций хранить на пользователя')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Для скольких пользователей записывать списки '
+                 'одной транзакцией')
+
+    def handle(self, *args, **options):
+        total = rebuild(count=options['count'],
+                        batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендации пересчитаны, пользователей: {total}'))
@@ -0,0 +1,100 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.synthetic import Generator, rebuild_derived, reset_sequences
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетических пользователей, группы, посты, '
+            'комментарии и подписки для нагрузочных проверок')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=300000)
+        parser.add_argument('--follows', type=int, default=200000)
+        parser.add_argument('--tags', type=int, default=1000)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Одинаковый seed даёт одинаковые данные')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк записывать одной транзакцией')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить посты')
+        parser.add_argument(
+            '--prefix', default='synthetic',
+            help='Начало имён пользователей, адресов групп и тегов')
+        parser.add_argument(
+            '--author-exponent', type=float, default=1.1,
+            help='Показатель степенного закона активности авторов, '
+                 '0 — равномерно')
+        parser.add_argument(
+            '--follow-exponent', type=float, default=1.2,
+            help='Показатель степенного закона популярности авторов '
+                 'у подписчиков')
+        parser.add_argument(
+            '--comment-exponent', type=float, default=1.0,
+            help='Показатель степенного закона популярности постов '
+                 'у комментаторов')
+        parser.add_argument(
+            '--tag-exponent', type=float, default=1.0,
+            help='Показатель степенного закона популярности тегов')
+        parser.add_argument(
+            '--group-ratio', type=float, default=0.5,
+            help='Доля постов в группах')
+        parser.add_argument(
+            '--tag-ratio', type=float, default=0.3,
+            help='Доля постов с хэштегом')
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счётчики, ленты подписок и '
+                 'поисковый индекс')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        if options['follows'] and options['users'] < 2:
+            raise CommandError('Для подписок нужны два пользователя')
+        if options['comments'] and not options['posts']:
+            raise CommandError('Для комментариев нужны посты')
+        self.reported = 0
+        self.started = time.monotonic()
+        generator = Generator(seed=options['seed'],
+                              batch_size=options['batch_size'],
+                              days=options['days'], progress=self.progress)
+        prefix = options['prefix']
+        generator.create_users(options['users'], prefix)
+        generator.create_groups(options['groups'], prefix)
+        generator.create_tags(options['tags'], prefix)
+        generator.create_posts(
+            options['posts'], options['author_exponent'],
+            options['group_ratio'], options['tag_ratio'],
+            options['tag_exponent'])
+        generator.create_comments(options['comments'],
+                                  options['comment_exponent'])
+        follows = generator.create_follows(options['follows'],
+                                           options['follow_exponent'])
+        reset_sequences()
+        self.stdout.write(f'Подписок без повторов: {follows}')
+        if not options['skip_derived']:
+            rebuild_derived(
+                progress=lambda label: self.stdout.write(
+                    f'Пересчёт: {label}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - self.started:.0f} с'))
+
+    def progress(self, label, done, total):
+        # Не чаще раза в секунду и всегда в конце каждой таблицы
+        now = time.monotonic()
+        if done < total and now - self.reported < 1:
+            return
+        self.reported = now
+        elapsed = now - self.started
+        percent = 100 * done // total if total else 100
+        self.stdout.write(
+            f'{label}: {done}/{total} ({percent}%), '
+            f'{elapsed:.0f} с от начала')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры картинок постов, у которых их ещё нет'
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None).filter(
+            image_thumbnail='').values_list('pk', flat=True)
+        done = 0
+        for pk in posts.iterator():
+            if generate(pk):
+                done += 1
+        self.stdout.write(self.style.SUCCESS(f'Миниатюр готово: {done}'))
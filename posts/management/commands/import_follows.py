@@ -0,0 +1,42 @@
+import contextlib
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.follows import import_csv
+
+
+class Command(BaseCommand):
+    help = ('Импортирует подписки из CSV со столбцами «подписчик, автор» '
+            '(имена пользователей)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Путь к CSV-файлу, «-» — стандартный ввод')
+        parser.add_argument(
+            '--unfollow', action='store_true',
+            help='Удалить перечисленные подписки вместо создания')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк записывать одной транзакцией')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть положительным')
+        path = options['path']
+        try:
+            source = (contextlib.nullcontext(sys.stdin) if path == '-'
+                      else open(path, newline='', encoding='utf-8'))
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть {path}: {error}')
+        with source as lines:
+            changed, skipped = import_csv(
+                lines, unfollow=options['unfollow'],
+                batch_size=options['batch_size'], progress=self.progress)
+        action = 'Удалено' if options['unfollow'] else 'Создано'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} подписок: {changed}, пропущено строк: {skipped}'))
+
+    def progress(self, done, changed, skipped):
+        self.stdout.write(f'Строк: {done}, подписок изменено: {changed}, '
+                          f'пропущено: {skipped}')
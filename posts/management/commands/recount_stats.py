@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики подписок, постов и комментариев '
+            'и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число расхождений')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько записей исправлять одним запросом')
+
+    def handle(self, *args, **options):
+        report = recount(dry_run=options['dry_run'],
+                         batch_size=options['batch_size'])
+        self.stdout.write(
+            f"Профилей без счётчиков: {report['missing']}\n"
+            f"Профилей с расхождениями: {report['profilestats']}\n"
+            f"Постов с расхождениями: {report['post']}")
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,229 @@
+"""Метрики запросов: SQL, шаблоны и кэш по каждому представлению.
+
+``MetricsMiddleware`` считает для запроса число SQL-запросов и их время,
+время отрисовки шаблонов (бэкенд ``TimedTemplates``) и попадания в кэш
+(бэкенды ``Metered*Cache``). Итог уходит в заголовок ``Server-Timing``,
+который показывают инструменты разработчика браузера, и копится по
+имени представления для страницы ``/metrics/`` в текстовом формате
+Prometheus. Счётчики свои у каждого процесса, как и принято для
+Prometheus: суммирует их уже сервер метрик.
+
+Если один и тот же запрос (с точностью до параметров) выполнился за
+запрос не меньше ``METRICS_REPEATED_QUERY_THRESHOLD`` раз, это почти
+всегда N+1 — в лог пишется предупреждение с текстом запроса.
+"""
+import contextlib
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+from yatube.sqlite_cache import SQLiteCache
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDERS = re.compile(r'\(%s(?:, %s)+\)')
+COUNTERS = (
+    ('requests', 'Обработано запросов'),
+    ('request_seconds', 'Время обработки запросов, секунд'),
+    ('sql_queries', 'Выполнено SQL-запросов'),
+    ('sql_seconds', 'Время SQL-запросов, секунд'),
+    ('template_seconds', 'Время отрисовки шаблонов, секунд'),
+    ('cache_hits', 'Попадания в кэш'),
+    ('cache_misses', 'Промахи кэша'),
+    ('repeated_queries', 'Запросы с повторяющимися SQL (N+1)'),
+)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.shapes = Counter()
+        # Вложенные вызовы кэша (get_many через get) не считаются
+        self.in_cache = False
+        # Вложенные отрисовки (render_to_string из тегов) уже входят
+        # во время внешней и отдельно не считаются
+        self.in_template = False
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.sql_queries += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated(self):
+        threshold = settings.METRICS_REPEATED_QUERY_THRESHOLD
+        return [(shape, count) for shape, count in self.shapes.items()
+                if count >= threshold]
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'sql;dur={self.sql_seconds * 1000:.1f};'
+            f'desc="{self.sql_queries} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+            f'cache;desc="hits={self.cache_hits} '
+            f'misses={self.cache_misses}"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def query_shape(sql):
+    """SQL без различий в длине списков ``IN (%s, ...)``."""
+    return PLACEHOLDERS.sub('(%s, ...)', sql)
+
+
+class Registry:
+    """Накопленные счётчики процесса по именам представлений."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = defaultdict(Counter)
+
+    def add(self, view, metrics, total):
+        with self.lock:
+            values = self.values[view]
+            values['requests'] += 1
+            values['request_seconds'] += total
+            values['sql_queries'] += metrics.sql_queries
+            values['sql_seconds'] += metrics.sql_seconds
+            values['template_seconds'] += metrics.template_seconds
+            values['cache_hits'] += metrics.cache_hits
+            values['cache_misses'] += metrics.cache_misses
+            values['repeated_queries'] += bool(metrics.repeated())
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def exposition(self):
+        """Счётчики в текстовом формате Prometheus."""
+        with self.lock:
+            values = {view: dict(counter)
+                      for view, counter in self.values.items()}
+        lines = []
+        for name, description in COUNTERS:
+            metric = f'yatube_{name}_total'
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} counter')
+            for view in sorted(values):
+                value = values[view].get(name, 0)
+                lines.append(f'{metric}{{view="{view}"}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.execute))
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        total = time.perf_counter() - metrics.started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.add(view, metrics, total)
+        for shape, count in metrics.repeated():
+            logger.warning('Повторяющийся запрос (N+1) в %s: %d раз %s',
+                           view, count, shape)
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing(total)
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current.get()
+        if metrics is None or metrics.in_template:
+            return super().render(context, request)
+        metrics.in_template = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - started
+            metrics.in_template = False
+
+
+class TimedTemplates(DjangoTemplates):
+    """Шаблоны Django с замером времени отрисовки."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(
+            super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(
+            super().get_template(template_name).template, self)
+
+
+class CacheMetricsMixin:
+    """Подсчёт попаданий и промахов кэша в метриках запроса."""
+    missing = object()
+
+    @contextlib.contextmanager
+    def metered(self):
+        metrics = current.get()
+        if metrics is None or metrics.in_cache:
+            yield None
+            return
+        metrics.in_cache = True
+        try:
+            yield metrics
+        finally:
+            metrics.in_cache = False
+
+    def get(self, key, default=None, version=None):
+        with self.metered() as metrics:
+            value = super().get(key, self.missing, version)
+            if metrics is not None:
+                if value is self.missing:
+                    metrics.cache_misses += 1
+                else:
+                    metrics.cache_hits += 1
+        return default if value is self.missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with self.metered() as metrics:
+            found = super().get_many(keys, version)
+            if metrics is not None:
+                metrics.cache_hits += len(found)
+                metrics.cache_misses += len(keys) - len(found)
+        return found
+
+
+class MeteredLocMemCache(CacheMetricsMixin, LocMemCache):
+    pass
+
+
+class MeteredSQLiteCache(CacheMetricsMixin, SQLiteCache):
+    pass
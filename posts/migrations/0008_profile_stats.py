@@ -0,0 +1,58 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:42
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    ProfileStats = apps.get_model('posts', 'ProfileStats')
+    users = User.objects.annotate(
+        posts_total=Count('posts', distinct=True),
+        followers_total=Count('following', distinct=True),
+        following_total=Count('follower', distinct=True),
+    )
+    ProfileStats.objects.bulk_create(
+        ProfileStats(user_id=user.pk,
+                     posts_count=user.posts_total,
+                     followers_count=user.followers_total,
+                     following_count=user.following_total)
+        for user in users.iterator()
+    )
+    for post in Post.objects.order_by().annotate(total=Count('comments')).filter(
+            total__gt=0).iterator():
+        Post.objects.filter(pk=post.pk).update(comment_count=post.total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0007_auto_20210331_1802'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='text',
+            field=models.TextField(help_text='Введите текст комментария', verbose_name='Текст комментария'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_image_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostImageRendition',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('format', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=255)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='posts.Post')),
+            ],
+            options={
+                'ordering': ('width',),
+                'unique_together': {('post', 'format', 'width')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Индекс posts.search.SQLiteFTSBackend. Заполняется командой
+# manage.py rebuild_search_index.
+FTS_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_search "
+    "USING fts5(text, comments, tokenize='unicode61')"
+)
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(FTS_TABLE)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_image_rendition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField()),
+                ('post', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'post'], name='posts_search_term_post'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:59
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия разбора из posts.hashtags на момент миграции: миграция не должна
+# зависеть от того, как код приложения изменится потом.
+TAG = re.compile(r'(?<![\w#])#(\w+)')
+MENTION = re.compile(r'(?<![\w@])@(\w[\w.+-]*\w|\w)')
+TAG_MAX_LENGTH = 64
+
+
+def extract_tags(text):
+    names = (name.lower()[:TAG_MAX_LENGTH] for name in TAG.findall(text))
+    return list(dict.fromkeys(names))
+
+
+def extract_mentions(text):
+    return list(dict.fromkeys(MENTION.findall(text)))
+
+
+def fill_links(apps, schema_editor):
+    Mention = apps.get_model('posts', 'Mention')
+    Post = apps.get_model('posts', 'Post')
+    PostTag = apps.get_model('posts', 'PostTag')
+    Tag = apps.get_model('posts', 'Tag')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    tags = {}
+    for post in Post.objects.order_by('pk').iterator():
+        for name in extract_tags(post.text):
+            if name not in tags:
+                tags[name] = Tag.objects.get_or_create(name=name)[0].pk
+            PostTag.objects.create(post_id=post.pk, tag_id=tags[name],
+                                   pub_date=post.pub_date)
+        users = User.objects.filter(
+            username__in=extract_mentions(post.text)).values_list(
+            'pk', flat=True)
+        Mention.objects.bulk_create(
+            Mention(post_id=post.pk, user_id=pk, pub_date=post.pub_date)
+            for pk in users)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='posts.Post')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_links', to='posts.Tag')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Mention',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', '-pub_date', '-post'], name='posts_posttag_tag_date'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='posttag',
+            unique_together={('tag', 'post')},
+        ),
+        migrations.AddIndex(
+            model_name='mention',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='posts_mention_user_date'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='mention',
+            unique_together={('user', 'post')},
+        ),
+        migrations.RunPython(fill_links, migrations.RunPython.noop),
+    ]
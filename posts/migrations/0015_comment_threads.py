@@ -0,0 +1,61 @@
+# Generated by Django 2.2.6 on 2026-10-18 03:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Формат пути корневого комментария (posts.comments) на момент миграции
+PATH_STEP = 10
+ROOT_KEY = 10 ** PATH_STEP - 1
+
+
+def root_segment(pk):
+    return f'{ROOT_KEY - pk:0{PATH_STEP}d}'
+
+
+def fill_paths(apps, schema_editor):
+    # До веток все комментарии были верхнего уровня
+    Comment = apps.get_model('posts', 'Comment')
+    last = 0
+    while True:
+        batch = list(Comment.objects.filter(pk__gt=last).order_by('pk')[:500])
+        if not batch:
+            break
+        for comment in batch:
+            comment.path = root_segment(comment.pk)
+        Comment.objects.bulk_update(batch, ['path'])
+        last = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_hashtags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='posts_comment_post_path'),
+        ),
+    ]
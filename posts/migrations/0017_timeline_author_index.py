@@ -0,0 +1,40 @@
+# Generated by Django 2.2.6 on 2026-10-18 04:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Неявный индекс внешнего ключа author заменяется явным индексом из
+# Meta. В базе индекс просто удаляется: AlterField на SQLite пересоздал
+# бы всю таблицу лент.
+FK_INDEX = 'posts_timelineentry_author_id_bf5bb453'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_suggestion'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    f'DROP INDEX IF EXISTS "{FK_INDEX}"',
+                    f'CREATE INDEX "{FK_INDEX}" '
+                    f'ON "posts_timelineentry" ("author_id")',
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='timelineentry',
+                    name='author',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['author'], name='posts_timeline_author'),
+        ),
+    ]
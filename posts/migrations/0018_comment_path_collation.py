@@ -0,0 +1,35 @@
+# Generated by Django 2.2.6 on 2026-10-18 04:40
+
+from django.db import migrations
+
+# Пути веток (posts.comments) сравниваются побайтно: поддерево — это
+# диапазон [path, path + ':'), страница сортируется по path. SQLite
+# сравнивает строки так всегда, а в PostgreSQL правило сортировки
+# колонки берётся из локали базы, поэтому колонке задаётся "C".
+# Django 2.2 не умеет задавать правило сортировки полю: после
+# AlterField поля path эту миграцию нужно повторить.
+SET_COLLATION = (
+    'ALTER TABLE "posts_comment" '
+    'ALTER COLUMN "path" TYPE varchar(255) COLLATE "{}"'
+)
+
+
+def set_c_collation(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SET_COLLATION.format('C'))
+
+
+def reset_collation(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SET_COLLATION.format('default'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_timeline_author_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_c_collation, reset_collation),
+    ]
@@ -1,3 +1,5 @@
+import hashlib
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -16,6 +18,14 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для лент: автор и группа одним запросом, варианты
+        картинок ещё одним, без отдельных запросов на каждый пост."""
+        return self.select_related('author', 'group').prefetch_related(
+            'renditions').order_by('-pub_date', '-id')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -29,13 +39,52 @@ class Post(models.Model):
                               verbose_name='Имя группы',
                               help_text='Введите имя группы',)
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # путь миниатюры, которую готовит posts.thumbnails
+    image_thumbnail = models.CharField(max_length=255, blank=True,
+                                       editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date', )
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='posts_post_date_id'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='posts_post_author_date'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='posts_post_group_date'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def card_version(self):
+        """Хэш всего, что выводится в карточке поста (post_item.html)."""
+        group = self.group
+        parts = (
+            self.text, self.author.username, self.pub_date.isoformat(),
+            self.image.name or '', self.image_thumbnail, self.comment_count,
+            group.slug if group else '', group.title if group else '',
+        )
+        return hashlib.md5(repr(parts).encode()).hexdigest()
+
+    @property
+    def image_thumbnail_url(self):
+        if not self.image_thumbnail:
+            return ''
+        return self.image.storage.url(self.image_thumbnail)
+
+    def image_sources(self):
+        """Значения srcset по форматам: {'webp': 'url 320w, ...'}."""
+        sources = {}
+        for rendition in self.renditions.all():
+            sources.setdefault(rendition.format, []).append(
+                f'{rendition.url} {rendition.width}w')
+        return {fmt: ', '.join(items) for fmt, items in sources.items()}
+
 
 class Comment(models.Model):
     text = models.TextField(
@@ -47,9 +96,25 @@ class Comment(models.Model):
                              related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='comments')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE,
+                               blank=True, null=True,
+                               related_name='replies')
+    # Материализованный путь от корня ветки, см. posts.comments.
+    # В PostgreSQL колонка сравнивается побайтно (COLLATE "C"), см.
+    # миграцию 0018_comment_path_collation
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Число всех ответов в поддереве, включая вложенные
+    replies_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ('-created', )
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='posts_comment_post_created'),
+            models.Index(fields=['post', 'path'],
+                         name='posts_comment_post_path'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -65,3 +130,152 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ['user', 'author']
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='posts_follow_author_user'),
+        ]
+
+
+class ProfileStats(models.Model):
+    """Денормализованные счётчики профиля.
+
+    Обновляются сигналами из posts.signals, расхождения исправляет
+    команда ``manage.py recount_stats``.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'Статистика {self.user_id}'
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост автора у подписчика.
+
+    Заполняется при публикации поста (fan-out on write), см. posts.timeline.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    # Индекс по автору задан явно в Meta: по нему ленты перестраиваются,
+    # когда автор пересекает TIMELINE_FANOUT_LIMIT.
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+', db_index=False)
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='posts_timeline_user_date'),
+            models.Index(fields=['user', 'author'],
+                         name='posts_timeline_user_author'),
+            models.Index(fields=['author'], name='posts_timeline_author'),
+        ]
+
+
+class PostImageRendition(models.Model):
+    """Вариант картинки поста определённой ширины и формата."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='renditions')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    format = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+
+    class Meta:
+        ordering = ('width', )
+        unique_together = ['post', 'format', 'width']
+
+    def __str__(self):
+        return self.path
+
+    @property
+    def url(self):
+        return self.post.image.storage.url(self.path)
+
+
+class SearchTerm(models.Model):
+    """Обратный индекс поиска: основа слова и её вес в посте.
+
+    Заполняется posts.search.InvertedIndexBackend. Внешний ключ без
+    ограничения в базе: индекс удаляемого поста убирается до удаления
+    самого поста и его комментариев.
+    """
+    MAX_LENGTH = 64
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             db_constraint=False,
+                             related_name='search_terms')
+    term = models.CharField(max_length=MAX_LENGTH)
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'post'],
+                         name='posts_search_term_post'),
+        ]
+
+
+class Tag(models.Model):
+    """Хэштег из текста поста (#тег), имя в нижнем регистре."""
+    MAX_LENGTH = 64
+
+    name = models.CharField(max_length=MAX_LENGTH, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class PostTag(models.Model):
+    """Пост с хэштегом. Дата поста продублирована, чтобы лента тега
+    читалась по индексу без сортировки, см. posts.hashtags."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='tag_links')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE,
+                            related_name='post_links')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['tag', 'post']
+        indexes = [
+            models.Index(fields=['tag', '-pub_date', '-post'],
+                         name='posts_posttag_tag_date'),
+        ]
+
+
+class Mention(models.Model):
+    """Упоминание пользователя (@username) в тексте поста."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='mentions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='mentions')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='posts_mention_user_date'),
+        ]
+
+
+class Suggestion(models.Model):
+    """Рекомендация «кого читать»: кандидат на подписку с местом в
+    списке пользователя. Списки пересобирает posts.suggestions."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='suggestions')
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE,
+                                  related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    # Сколько авторов из подписок пользователя читают кандидата
+    mutual = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ('rank', )
+        unique_together = ['user', 'rank']
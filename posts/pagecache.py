@@ -0,0 +1,95 @@
+"""Кэш целых страниц для анонимных посетителей.
+
+Запись хранится под ключом из пути и параметров запроса вместе с
+версией содержимого — ETag страницы (posts.conditional), который
+меняется при любой записи в показанные на странице области. Поэтому
+запись не удаляется при изменениях, а устаревает:
+
+* устаревшую страницу пересчитывает один процесс, взявший блокировку,
+  остальные в это время отдают старую копию;
+* незадолго до истечения ``PAGE_CACHE_TIMEOUT`` страница с некоторой
+  вероятностью пересчитывается заранее (probabilistic early
+  expiration): чем дороже отрисовка и ближе срок, тем вероятность
+  выше, и волна одновременных промахов не возникает.
+
+Версия и блокировка имеют смысл, только если кэш общий для всех
+процессов (``posts.cache.is_shared``), иначе кэш страниц отключён.
+"""
+import hashlib
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from posts.cache import is_shared
+
+PAGE_KEY = 'page:{}'
+LOCK_KEY = 'page-lock:{}'
+
+
+def page_key(request):
+    return hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+
+def refresh_early(entry, now):
+    """Решить, пересчитать ли свежую запись до истечения срока."""
+    gap = -entry['delta'] * settings.PAGE_CACHE_BETA * math.log(
+        1 - random.random())
+    return now + gap >= entry['expires']
+
+
+def from_entry(entry, state):
+    response = HttpResponse(entry['content'],
+                            content_type=entry['content_type'])
+    response['ETag'] = entry['version']
+    response['Last-Modified'] = entry['last_modified']
+    response['X-Page-Cache'] = state
+    return response
+
+
+def cacheable(request, response):
+    # Страница с CSRF-токеном привязана к cookie посетителя
+    return (response.status_code == 200 and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED'))
+
+
+def fetch(request, version, last_modified, render):
+    """Страница из кэша или результат ``render()``.
+
+    ``version`` и ``last_modified`` — заголовки ETag и Last-Modified
+    текущего содержимого. У отданной устаревшей копии они свои.
+    """
+    if not is_shared():
+        return render()
+    key = page_key(request)
+    entry = cache.get(PAGE_KEY.format(key))
+    now = time.time()
+    fresh = entry is not None and entry['version'] == version
+    if fresh and not refresh_early(entry, now):
+        return from_entry(entry, 'hit')
+    locked = cache.add(LOCK_KEY.format(key), 1,
+                       settings.PAGE_CACHE_LOCK_TIMEOUT)
+    if entry is not None and not locked:
+        # Страницу уже пересчитывает другой процесс
+        return from_entry(entry, 'hit' if fresh else 'stale')
+    try:
+        response = render()
+        if cacheable(request, response):
+            finished = time.time()
+            cache.set(PAGE_KEY.format(key), {
+                'version': version,
+                'last_modified': last_modified,
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'delta': finished - now,
+                'expires': finished + settings.PAGE_CACHE_TIMEOUT,
+            }, settings.PAGE_CACHE_STALE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(LOCK_KEY.format(key))
+    response['X-Page-Cache'] = 'miss'
+    return response
@@ -0,0 +1,293 @@
+import base64
+import binascii
+import datetime
+import heapq
+import json
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder обрезает микросекунды, а курсору нужна точная дата
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (keyset) вместо OFFSET.
+
+    Страница выбирается условием по полям ``ordering`` относительно
+    последней (или первой) записи соседней страницы, поэтому глубокие
+    страницы стоят столько же, сколько первая, а ``COUNT(*)`` не нужен.
+    Номера страниц (``?page=N``) поддерживаются для старых ссылок.
+    В ``ordering`` можно указывать и аннотации запроса.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id'),
+                 approximate_count=False, count_limit=1000):
+        self.ordering = tuple(ordering)
+        self.approximate_count = approximate_count
+        self.count_limit = count_limit
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+
+    @cached_property
+    def count(self):
+        if not self.approximate_count:
+            return super().count
+        return self.object_list[:self.count_limit + 1].count()
+
+    @property
+    def count_is_capped(self):
+        return self.approximate_count and self.count > self.count_limit
+
+    def cursor_values(self, obj):
+        return [getattr(obj, name.lstrip('-')) for name in self.ordering]
+
+    def encode_cursor(self, obj, reverse=False):
+        values = self.cursor_values(obj)
+        data = json.dumps({'v': values, 'r': int(reverse)},
+                          cls=CursorEncoder, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(data.encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        padding = '=' * (-len(cursor) % 4)
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            raw_values = data['v']
+            reverse = bool(data['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise InvalidCursor(cursor)
+        if not isinstance(raw_values, list) or (
+                len(raw_values) != len(self.ordering)):
+            raise InvalidCursor(cursor)
+        values = []
+        for name, value in zip(self.ordering, raw_values):
+            field = self.ordering_field(name.lstrip('-'))
+            try:
+                values.append(field.to_python(value))
+            except ValidationError:
+                raise InvalidCursor(cursor)
+        return values, reverse
+
+    def ordering_field(self, name):
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.object_list.model._meta.get_field(name)
+
+    def _keyset_filter(self, values, reverse):
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-')
+            lookup = 'gt' if descending == reverse else 'lt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def get_cursor_page(self, cursor=None):
+        """Вернуть страницу после (или перед) позицией из токена.
+
+        Некорректный токен, как и в ``get_page``, даёт первую страницу.
+        """
+        values, reverse = None, False
+        if cursor:
+            try:
+                values, reverse = self.decode_cursor(cursor)
+            except InvalidCursor:
+                values = None
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, reverse))
+        if reverse:
+            queryset = queryset.reverse()
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if reverse:
+            object_list.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = values is not None, has_more
+        return CursorPage(object_list, None, self,
+                          has_previous=has_previous, has_next=has_next)
+
+    def get_lazy_cursor_page(self, cursor=None):
+        """Страница после позиции из токена, которая обращается к базе
+        только при чтении: для фрагментов в ``{% cache %}``.
+
+        Обратные токены читаются сразу, как в ``get_cursor_page``.
+        """
+        values = None
+        if cursor:
+            try:
+                values, reverse = self.decode_cursor(cursor)
+            except InvalidCursor:
+                values = None
+            else:
+                if reverse:
+                    return self.get_cursor_page(cursor)
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, False))
+        return LazyCursorPage(queryset[:self.per_page], self,
+                              has_previous=values is not None)
+
+    def _get_page(self, object_list, number, paginator):
+        page = CursorPage(list(object_list), number, paginator)
+        page.has_previous_page = number > 1
+        page.has_next_page = number < self.num_pages
+        return page
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Курсорная пагинация по нескольким лентам с одинаковым порядком.
+
+    Из каждой ленты читается не больше страницы после (или перед)
+    курсором, страницы сливаются по полям ``ordering``, поэтому
+    глубокие страницы стоят столько же, сколько первая. Номера
+    страниц не поддерживаются: ``?page=N`` даёт первую страницу.
+    """
+
+    def __init__(self, object_lists, per_page, ordering=('-pub_date', '-id'),
+                 **kwargs):
+        self.paginators = [
+            CursorPaginator(object_list, per_page, ordering=ordering,
+                            **kwargs)
+            for object_list in object_lists
+        ]
+        super().__init__(object_lists[0], per_page, ordering=ordering,
+                         **kwargs)
+
+    @cached_property
+    def count(self):
+        return sum(paginator.count for paginator in self.paginators)
+
+    def get_page(self, number):
+        return self.get_cursor_page()
+
+    def get_cursor_page(self, cursor=None):
+        if len(self.paginators) == 1:
+            return super().get_cursor_page(cursor)
+        reverse = False
+        if cursor:
+            try:
+                reverse = self.decode_cursor(cursor)[1]
+            except InvalidCursor:
+                cursor = None
+        pages = [paginator.get_cursor_page(cursor)
+                 for paginator in self.paginators]
+        key = attrgetter(*(name.lstrip('-') for name in self.ordering))
+        merged = list(heapq.merge(
+            *(page.object_list for page in pages), key=key,
+            reverse=self.ordering[0].startswith('-'),
+        ))
+        has_more = len(merged) > self.per_page
+        if reverse:
+            object_list = merged[-self.per_page:]
+        else:
+            object_list = merged[:self.per_page]
+        return CursorPage(
+            object_list, None, self,
+            has_previous=(reverse and has_more) or any(
+                page.has_previous_page for page in pages),
+            has_next=(not reverse and has_more) or any(
+                page.has_next_page for page in pages),
+        )
+
+
+class CursorPage(Page):
+    def __init__(self, object_list, number, paginator,
+                 has_previous=False, has_next=False):
+        super().__init__(object_list, number, paginator)
+        self.has_previous_page = has_previous
+        self.has_next_page = has_next
+
+    def __repr__(self):
+        if self.number is None:
+            return '<CursorPage of %s>' % len(self)
+        return super().__repr__()
+
+    def has_next(self):
+        return self.has_next_page and bool(self.object_list)
+
+    def has_previous(self):
+        return self.has_previous_page and bool(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], reverse=True)
+
+
+class LazyCursorPage(CursorPage):
+    """Страница, у которой ``object_list`` — ленивый QuerySet, как у
+    обычного ``Page``. Есть ли следующая страница, проверяется
+    отдельным EXISTS после последней записи и только по запросу."""
+
+    def __init__(self, object_list, paginator, has_previous=False):
+        Page.__init__(self, object_list, None, paginator)
+        self.has_previous_page = has_previous
+
+    @cached_property
+    def last(self):
+        objects = list(self.object_list)
+        return objects[-1] if objects else None
+
+    @cached_property
+    def has_next_page(self):
+        if self.last is None:
+            return False
+        values = self.paginator.cursor_values(self.last)
+        return self.paginator.object_list.filter(
+            self.paginator._keyset_filter(values, False)).exists()
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page and self.last is not None
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor(self.last)
+
+
+def paginate(request, object_list, paginator_class=CursorPaginator, **kwargs):
+    """Страница ленты по параметрам запроса ``cursor`` или ``page``.
+
+    Для ленты из нескольких частей передаётся список запросов и
+    ``paginator_class=MergedCursorPaginator``.
+    """
+    kwargs.setdefault('approximate_count', settings.POSTS_APPROXIMATE_COUNT)
+    kwargs.setdefault('count_limit', settings.POSTS_COUNT_LIMIT)
+    paginator = paginator_class(object_list, settings.POSTS_PER_PAGE,
+                                **kwargs)
+    cursor = request.GET.get('cursor')
+    page_number = request.GET.get('page')
+    if not cursor and page_number:
+        return paginator.get_page(page_number)
+    return paginator.get_cursor_page(cursor)
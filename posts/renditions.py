@@ -0,0 +1,86 @@
+"""Картинки постов в нескольких ширинах и форматах для srcset.
+
+Кодирование в Pillow нагружает процессор, поэтому идёт в пуле
+процессов. Дочерние процессы получают только пути к файлам и не
+трогают Django; записи о готовых вариантах делает вызывающий поток.
+"""
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from posts.models import PostImageRendition
+
+MIME_TYPES = {
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'avif': 'image/avif',
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.RENDITION_PROCESSES)
+    return _executor
+
+
+def submit(fn, *args):
+    """Выполнить ``fn`` в пуле процессов или сразу, если пул выключен."""
+    if settings.RENDITION_PROCESSES:
+        return get_executor().submit(fn, *args)
+    future = Future()
+    future.set_result(fn(*args))
+    return future
+
+
+def available_formats():
+    """Форматы из POST_RENDITION_FORMATS, которые умеет сохранять Pillow."""
+    Image.init()
+    return [fmt for fmt in settings.POST_RENDITION_FORMATS
+            if fmt.upper() in Image.SAVE]
+
+
+def encode(source, target, width, ratio, fmt, quality):
+    """Обрезать картинку по пропорции ``ratio``, уменьшить до ``width``
+    и сохранить в ``fmt``. Выполняется в дочернем процессе."""
+    height = max(1, round(width / ratio))
+    with Image.open(source) as image:
+        image = ImageOps.fit(image.convert('RGB'), (width, height),
+                             Image.LANCZOS)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        image.save(target, fmt.upper(), quality=quality)
+    return width, height
+
+
+def rendition_name(post, width, fmt):
+    stem = os.path.splitext(os.path.basename(post.image.name))[0]
+    return f'posts/renditions/{post.pk}/{stem}-{width}.{fmt}'
+
+
+def generate(post):
+    """Подготовить все варианты картинки поста и записать их в таблицу."""
+    storage = post.image.storage
+    source = storage.path(post.image.name)
+    ratio = settings.POST_RENDITION_RATIO
+    quality = settings.POST_RENDITION_QUALITY
+    jobs = {}
+    for fmt in available_formats():
+        for width in settings.POST_RENDITION_WIDTHS:
+            name = rendition_name(post, width, fmt)
+            jobs[(name, fmt)] = submit(encode, source, storage.path(name),
+                                       width, ratio, fmt, quality)
+    renditions = []
+    for (name, fmt), future in jobs.items():
+        width, height = future.result()
+        renditions.append(PostImageRendition(
+            post=post, width=width, height=height, format=fmt, path=name))
+    with transaction.atomic():
+        post.renditions.all().delete()
+        PostImageRendition.objects.bulk_create(renditions)
+    return renditions
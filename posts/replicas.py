@@ -0,0 +1,114 @@
+"""Чтение лент с реплик базы.
+
+Запись всегда идёт в основную базу (``default``). Представления,
+помеченные ``replica_reads``, на GET читают со случайной реплики из
+``REPLICA_DATABASES``, кроме трёх случаев, когда реплика может
+отставать от того, что пользователь ожидает увидеть:
+
+* в этом же запросе уже была запись;
+* пользователь сам писал в базу в последние ``REPLICA_MAX_LAG``
+  секунд: после записи ``ReplicaMiddleware`` ставит cookie, и пока
+  она жива, все его чтения идут в основную базу (read-your-writes);
+* показанные на странице области кэша (posts.cache) менялись в
+  последние ``REPLICA_MAX_LAG`` секунд, см. ``primary_if_changed``.
+  Иначе страница с ETag нового поколения могла бы быть собрана по
+  старым данным и закэшироваться до следующего изменения.
+
+Сессии всегда читаются из основной базы.
+"""
+import contextlib
+import contextvars
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from posts import cache
+
+PIN_COOKIE = 'pin_primary'
+PRIMARY_ONLY_APPS = {'sessions'}
+
+
+class ReadState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+        self.replica = None
+
+
+state = contextvars.ContextVar('replica_state', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        current = state.get()
+        if current is None:
+            return None
+        if (current.replica and not current.wrote
+                and model._meta.app_label not in PRIMARY_ONLY_APPS):
+            return current.replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        current = state.get()
+        if current is not None:
+            current.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        current = ReadState(pinned=PIN_COOKIE in request.COOKIES)
+        token = state.set(current)
+        try:
+            response = self.get_response(request)
+        finally:
+            state.reset(token)
+        if current.wrote:
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_MAX_LAG,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+def replica_reads(view):
+    """Читать данные представления с реплики, если это безопасно."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        current = state.get()
+        if (current is None or current.pinned
+                or not settings.REPLICA_DATABASES
+                or request.method not in ('GET', 'HEAD')):
+            return view(request, *args, **kwargs)
+        current.replica = random.choice(settings.REPLICA_DATABASES)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            current.replica = None
+    return wrapper
+
+
+@contextlib.contextmanager
+def primary_if_changed(changed):
+    """Читать из основной базы, если данные менялись в момент
+    ``changed`` (Unix time) недавно, и реплика может их не знать.
+    Отметкам из кэша одного процесса верить нельзя."""
+    current = state.get()
+    replica = current.replica if current is not None else None
+    if replica and (not cache.is_shared()
+                    or time.time() - changed < settings.REPLICA_MAX_LAG):
+        current.replica = None
+    try:
+        yield
+    finally:
+        if current is not None:
+            current.replica = replica
@@ -0,0 +1,280 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Индекс обновляется сигналами при каждой записи поста или комментария
+(см. posts.signals): новый или удалённый комментарий меняет только
+свои слова в индексе поста, не перечитывая остальные комментарии.
+Полностью индекс пересобирается командой
+``manage.py rebuild_search_index``. Слова приводятся к основе
+стеммером (posts.stemmer) и при индексации, и при поиске.
+
+Хранилище индекса выбирается настройкой ``SEARCH_BACKEND``:
+
+* ``SQLiteFTSBackend`` — виртуальная таблица FTS5 с ранжированием bm25;
+* ``InvertedIndexBackend`` — таблица SearchTerm, работает на любой базе.
+"""
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.utils.module_loading import import_string
+
+from posts.models import Comment, Post, SearchTerm
+from posts.stemmer import stem
+
+WORD = re.compile(r'\w+')
+# Совпадение в тексте поста весит больше, чем в комментарии.
+TEXT_WEIGHT = 3
+COMMENT_WEIGHT = 1
+
+
+def terms(text):
+    """Основы слов текста в порядке появления."""
+    return [stem(word)[:SearchTerm.MAX_LENGTH]
+            for word in WORD.findall(text)]
+
+
+def query_terms(query):
+    return list(dict.fromkeys(terms(query)))
+
+
+class SQLiteFTSBackend:
+    """Индекс в виртуальной таблице FTS5 ``posts_search``.
+
+    Строка таблицы — пост, rowid совпадает с его первичным ключом.
+    В колонках лежат основы слов поста и его комментариев.
+    """
+    table = 'posts_search'
+
+    def index(self, post_id, text, comments):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {self.table} '
+                f'(rowid, text, comments) VALUES (%s, %s, %s)',
+                [post_id, ' '.join(terms(text)),
+                 ' '.join(terms(' '.join(comments)))])
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s',
+                           [post_id])
+
+    def change_comments(self, post_id, change):
+        """Заменить основы слов комментариев поста на ``change(words)``.
+        Поста, которого нет в индексе, это не касается."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT comments FROM {self.table} WHERE rowid = %s',
+                [post_id])
+            row = cursor.fetchone()
+            if row is None:
+                return
+            cursor.execute(
+                f'UPDATE {self.table} SET comments = %s WHERE rowid = %s',
+                [' '.join(change(row[0].split())), post_id])
+
+    def add_comment(self, post_id, text):
+        self.change_comments(post_id, lambda words: words + terms(text))
+
+    def remove_comment(self, post_id, text):
+        # Порядок основ в колонке не важен: запросы ищут отдельные слова
+        self.change_comments(post_id, lambda words: list(
+            (Counter(words) - Counter(terms(text))).elements()))
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def match(self, words):
+        return ' '.join(f'"{word}"' for word in words)
+
+    def count(self, words):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s', [self.match(words)])
+            return cursor.fetchone()[0]
+
+    def search(self, words, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} '
+                f'WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, %s, %s), rowid DESC '
+                f'LIMIT %s OFFSET %s',
+                [self.match(words), TEXT_WEIGHT, COMMENT_WEIGHT,
+                 limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class InvertedIndexBackend:
+    """Индекс в таблице SearchTerm: основа слова, пост и её вес в посте.
+
+    Вес — число вхождений основы с учётом TEXT_WEIGHT и COMMENT_WEIGHT.
+    Находятся посты, содержащие все слова запроса, выше — с большим
+    суммарным весом.
+    """
+
+    def index(self, post_id, text, comments):
+        weights = Counter()
+        for term in terms(text):
+            weights[term] += TEXT_WEIGHT
+        for comment in comments:
+            for term in terms(comment):
+                weights[term] += COMMENT_WEIGHT
+        self.remove(post_id)
+        SearchTerm.objects.bulk_create(
+            SearchTerm(post_id=post_id, term=term, weight=weight)
+            for term, weight in weights.items())
+
+    def remove(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def change_weights(self, post_id, text, sign):
+        """Прибавить (``sign`` = 1) или вычесть (-1) веса слов
+        комментария: по запросу на каждую величину изменения."""
+        counts = Counter(terms(text))
+        entries = SearchTerm.objects.filter(post_id=post_id)
+        present = dict(entries.filter(term__in=counts).values_list(
+            'term', 'weight'))
+        changes = defaultdict(list)
+        gone = []
+        for term, count in counts.items():
+            delta = sign * count * COMMENT_WEIGHT
+            if term not in present:
+                continue
+            if present[term] + delta > 0:
+                changes[delta].append(term)
+            else:
+                gone.append(term)
+        if gone:
+            entries.filter(term__in=gone).delete()
+        for delta, words in changes.items():
+            entries.filter(term__in=words).update(weight=F('weight') + delta)
+        if sign > 0:
+            SearchTerm.objects.bulk_create(
+                SearchTerm(post_id=post_id, term=term,
+                           weight=count * COMMENT_WEIGHT)
+                for term, count in counts.items() if term not in present)
+
+    def add_comment(self, post_id, text):
+        self.change_weights(post_id, text, 1)
+
+    def remove_comment(self, post_id, text):
+        self.change_weights(post_id, text, -1)
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def matches(self, words):
+        return SearchTerm.objects.filter(term__in=words).values(
+            'post_id').annotate(matched=Count('term')).filter(
+            matched=len(words))
+
+    def count(self, words):
+        return self.matches(words).count()
+
+    def search(self, words, offset, limit):
+        ranked = self.matches(words).annotate(
+            score=Sum('weight')).order_by('-score', '-post_id')
+        return [row['post_id'] for row in ranked[offset:offset + limit]]
+
+
+def get_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+def index_post(post_id):
+    """Переиндексировать пост вместе с комментариями."""
+    text = Post.objects.filter(pk=post_id).values_list(
+        'text', flat=True).first()
+    if text is None:
+        return
+    comments = Comment.objects.filter(post_id=post_id).values_list(
+        'text', flat=True)
+    get_backend().index(post_id, text, list(comments))
+
+
+def remove_post(post_id):
+    get_backend().remove(post_id)
+
+
+def add_comment(post_id, text):
+    """Добавить слова нового комментария в индекс поста."""
+    get_backend().add_comment(post_id, text)
+
+
+def remove_comment(post_id, text):
+    """Убрать слова удалённого комментария из индекса поста."""
+    get_backend().remove_comment(post_id, text)
+
+
+def rebuild(batch_size=500):
+    """Пересобрать индекс целиком, возвращает число постов.
+
+    Посты читаются пачками по ключу, и каждая пачка индексируется
+    одной транзакцией: долгое открытое чтение не даёт SQLite сбросить
+    журнал WAL, и на больших базах он разрастается до гигабайтов.
+    """
+    backend = get_backend()
+    backend.clear()
+    total = 0
+    posts = Post.objects.order_by('pk').values_list('pk', 'text')
+    batch = list(posts[:batch_size])
+    while batch:
+        with transaction.atomic():
+            total += index_batch(backend, batch)
+        batch = list(posts.filter(pk__gt=batch[-1][0])[:batch_size])
+    return total
+
+
+def index_batch(backend, posts):
+    comments = {}
+    for post_id, text in Comment.objects.filter(
+            post_id__in=[pk for pk, _ in posts]).values_list(
+            'post_id', 'text'):
+        comments.setdefault(post_id, []).append(text)
+    for post_id, text in posts:
+        backend.index(post_id, text, comments.get(post_id, []))
+    return len(posts)
+
+
+class SearchResults:
+    """Найденные посты в порядке релевантности.
+
+    Поддерживает ``count()`` и срезы, поэтому её можно отдать обычному
+    ``Paginator``: срез запрашивает у индекса только ключи постов
+    страницы и загружает сами посты одним запросом.
+    """
+    ordered = True
+
+    def __init__(self, query, backend=None):
+        self.words = query_terms(query)
+        self.backend = backend or get_backend()
+
+    def count(self):
+        if not self.words:
+            return 0
+        return self.backend.count(self.words)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.words:
+            return []
+        start = index.start or 0
+        ids = self.backend.search(self.words, start, index.stop - start)
+        posts = Post.objects.feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_post_ids(query, limit):
+    """Ключи первых ``limit`` найденных постов."""
+    words = query_terms(query)
+    if not words:
+        return []
+    return get_backend().search(words, 0, limit)
@@ -0,0 +1,149 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from posts import cache, comments, hashtags, search, timeline
+from posts.models import Comment, Follow, Group, Post, ProfileStats, User
+
+
+def bump_stats(user_id, **deltas):
+    """Изменить счётчики профиля на заданные величины одним UPDATE."""
+    if user_id is None:
+        return
+    changes = {name: F(name) + delta for name, delta in deltas.items()}
+    with transaction.atomic():
+        updated = ProfileStats.objects.filter(user_id=user_id).update(
+            **changes)
+        # Без строки счётчиков уменьшать нечего: пользователь удаляется
+        # вместе с постами, или счётчики восстановит recount_stats.
+        if not updated and min(deltas.values()) > 0:
+            ProfileStats.objects.get_or_create(user_id=user_id)
+            ProfileStats.objects.filter(user_id=user_id).update(**changes)
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        ProfileStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_delete, sender=User)
+def release_follows(sender, instance, **kwargs):
+    # Follow.user и Follow.author обнуляются через SET_NULL без сигналов,
+    # поэтому счётчики второй стороны подписки правим заранее.
+    authors = list(Follow.objects.filter(
+        user=instance, author__isnull=False,
+    ).values_list('author_id', flat=True))
+    ProfileStats.objects.filter(user__in=authors).update(
+        followers_count=F('followers_count') - 1)
+    # SET_NULL заранее, чтобы автор, снова ставший обычным, не
+    # разложил посты в ленту удаляемого пользователя.
+    Follow.objects.filter(user=instance).update(user=None)
+    timeline.rebalance({author: -1 for author in authors})
+    ProfileStats.objects.filter(
+        user__in=Follow.objects.filter(author=instance).values('user'),
+    ).update(following_count=F('following_count') - 1)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, raw, **kwargs):
+    # Пост, перенесённый в другую группу, должен пропасть из старой.
+    if instance.pk is not None and not raw:
+        instance.previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        bump_stats(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+    if not raw:
+        hashtags.update_post(instance)
+        search.index_post(instance.pk)
+    cache.bump_post(instance.pk, instance.author_id, instance.group_id,
+                    getattr(instance, 'previous_group_id', None))
+
+
+@receiver(pre_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    # До удаления комментариев поста: для поста, которого уже нет в
+    # индексе, удаление комментария индекс не трогает.
+    search.remove_post(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_stats(instance.author_id, posts_count=-1)
+    cache.bump_post(instance.pk, instance.author_id, instance.group_id)
+
+
+def bump_commented_post(post_id):
+    post = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id').first()
+    if post is not None:
+        cache.bump_post(post_id, *post)
+
+
+def bump_ancestors(comment, delta):
+    """Изменить ``replies_count`` всех предков комментария."""
+    ancestors = comments.path_ids(comment.path)[:-1]
+    if ancestors:
+        Comment.objects.filter(pk__in=ancestors).update(
+            replies_count=F('replies_count') + delta)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        instance.path, instance.depth = comments.place(instance)
+        Comment.objects.filter(pk=instance.pk).update(
+            path=instance.path, depth=instance.depth)
+        bump_ancestors(instance, 1)
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1)
+        search.add_comment(instance.post_id, instance.text)
+    elif not raw:
+        search.index_post(instance.post_id)
+    bump_commented_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_ancestors(instance, -1)
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=F('comment_count') - 1)
+    search.remove_comment(instance.post_id, instance.text)
+    bump_commented_post(instance.post_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    cache.bump(cache.GROUPS_SCOPE)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw, **kwargs):
+    if created and not raw and instance.user_id and instance.author_id:
+        with transaction.atomic():
+            bump_stats(instance.author_id, followers_count=1)
+            bump_stats(instance.user_id, following_count=1)
+            timeline.backfill(instance.user_id, instance.author_id)
+            timeline.rebalance({instance.author_id: 1})
+        cache.bump(cache.stats_scope(instance.author_id),
+                   cache.stats_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if instance.user_id and instance.author_id:
+        with transaction.atomic():
+            bump_stats(instance.author_id, followers_count=-1)
+            bump_stats(instance.user_id, following_count=-1)
+            timeline.prune(instance.user_id, instance.author_id)
+            timeline.rebalance({instance.author_id: -1})
+        cache.bump(cache.stats_scope(instance.author_id),
+                   cache.stats_scope(instance.user_id))
@@ -0,0 +1,227 @@
+"""Массовая генерация синтетических данных для нагрузочных проверок.
+
+Строки пишутся через ``bulk_create`` пачками, каждая пачка — одна
+транзакция. Первичные ключи назначаются заранее, подряд после текущего
+максимума: ссылки на авторов, посты и теги считаются по номеру без
+чтения из базы, и память не растёт с объёмом данных. Один и тот же
+``seed`` даёт одни и те же данные.
+
+Популярность авторов, постов и тегов распределена по степенному закону
+с показателем ``exponent`` (0 — равномерно): несколько записей получают
+большую часть постов, комментариев и подписчиков, как в живой сети.
+
+``bulk_create`` не вызывает сигналы, поэтому счётчики, ленты подписок и
+поисковый индекс пересобираются отдельно, см. ``rebuild_derived``.
+"""
+import contextlib
+import random
+from datetime import timedelta
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from posts import cache, counters, search, timeline
+from posts.comments import root_segment
+from posts.models import Comment, Follow, Group, Post, PostTag, Tag, User
+
+WORDS = (
+    'день утро вечер город дорога лес море река дом окно книга музыка '
+    'кофе чай друг работа отпуск погода снег дождь солнце фото кот собака '
+    'новость проект идея вопрос ответ история путь сад кино театр поезд '
+    'самолёт встреча праздник завтрак обед ужин прогулка мост улица парк'
+).split()
+UNUSABLE_PASSWORD = '!synthetic'
+
+
+def power_law(rng, count, exponent):
+    """Номер от 0 до ``count - 1``; чем меньше номер, тем чаще он
+    выпадает. Обратная функция непрерывного степенного распределения,
+    без таблиц весов."""
+    if exponent == 0:
+        return rng.randrange(count)
+    u = rng.random()
+    if exponent == 1:
+        rank = (count + 1) ** u
+    else:
+        power = 1 - exponent
+        rank = (((count + 1) ** power - 1) * u + 1) ** (1 / power)
+    return min(count - 1, int(rank) - 1)
+
+
+def next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+@contextlib.contextmanager
+def explicit_dates(*fields):
+    """Сохранять заданные даты в полях с auto_now_add."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Generator:
+    def __init__(self, seed=0, batch_size=5000, days=365, progress=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.end = timezone.now()
+        self.start = self.end - timedelta(days=days)
+        self.progress = progress or (lambda label, done, total: None)
+        self.users = self.groups = self.posts = self.tags = (0, 0)
+        self.tag_prefix = 'tag'
+
+    def write(self, label, model, rows, total, links=None,
+              ignore_conflicts=False):
+        """Записать объекты из ``rows`` пачками по ``batch_size``.
+
+        ``links`` — список связанных объектов, который ``rows``
+        пополняет по ходу; он записывается вместе с каждой пачкой.
+        """
+        done = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                done += self.flush(model, batch, links, ignore_conflicts)
+                self.progress(label, done, total)
+                batch = []
+        if batch:
+            done += self.flush(model, batch, links, ignore_conflicts)
+        self.progress(label, done, total)
+        return done
+
+    def flush(self, model, batch, links, ignore_conflicts):
+        with transaction.atomic():
+            model.objects.bulk_create(batch,
+                                      ignore_conflicts=ignore_conflicts)
+            if links:
+                type(links[0]).objects.bulk_create(links)
+                links.clear()
+        return len(batch)
+
+    def pick(self, span, exponent):
+        first, count = span
+        return first + power_law(self.rng, count, exponent)
+
+    def post_date(self, pk):
+        # Посты идут по времени в порядке ключей
+        first, count = self.posts
+        share = (pk - first + 1) / count
+        return self.start + (self.end - self.start) * share
+
+    def text(self, words, tag_ratio, tag_exponent):
+        text = ' '.join(self.rng.choices(WORDS, k=words)).capitalize()
+        tags = []
+        if self.tags[1] and self.rng.random() < tag_ratio:
+            tags.append(self.pick(self.tags, tag_exponent))
+            text += f' #{self.tag_prefix}{tags[0]}'
+        return text, tags
+
+    def create_users(self, count, prefix):
+        first = next_pk(User)
+        self.users = (first, count)
+        rows = (User(pk=pk, username=f'{prefix}{pk}',
+                     password=UNUSABLE_PASSWORD)
+                for pk in range(first, first + count))
+        return self.write('users', User, rows, count)
+
+    def create_groups(self, count, prefix):
+        first = next_pk(Group)
+        self.groups = (first, count)
+        rows = (Group(pk=pk, slug=f'{prefix}-{pk}', title=f'Группа {pk}',
+                      description=' '.join(self.rng.choices(WORDS, k=12)))
+                for pk in range(first, first + count))
+        return self.write('groups', Group, rows, count)
+
+    def create_tags(self, count, prefix):
+        first = next_pk(Tag)
+        self.tags = (first, count)
+        self.tag_prefix = f'{prefix}tag'
+        rows = (Tag(pk=pk, name=f'{self.tag_prefix}{pk}')
+                for pk in range(first, first + count))
+        return self.write('tags', Tag, rows, count)
+
+    def create_posts(self, count, exponent, group_ratio, tag_ratio,
+                     tag_exponent):
+        first = next_pk(Post)
+        self.posts = (first, count)
+        links = []
+
+        def rows():
+            for pk in range(first, first + count):
+                text, tags = self.text(self.rng.randint(5, 40), tag_ratio,
+                                       tag_exponent)
+                group = None
+                if self.groups[1] and self.rng.random() < group_ratio:
+                    group = self.pick(self.groups, 0)
+                date = self.post_date(pk)
+                links.extend(PostTag(post_id=pk, tag_id=tag, pub_date=date)
+                             for tag in tags)
+                yield Post(pk=pk, text=text, pub_date=date, group_id=group,
+                           author_id=self.pick(self.users, exponent))
+
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            return self.write('posts', Post, rows(), count, links=links)
+
+    def create_comments(self, count, exponent):
+        """Комментарии верхнего уровня, путь ветки назначается сразу."""
+        first = next_pk(Comment)
+
+        def rows():
+            for pk in range(first, first + count):
+                post = self.pick(self.posts, exponent)
+                created = self.post_date(post) + timedelta(
+                    minutes=self.rng.expovariate(1 / 60))
+                yield Comment(
+                    pk=pk, path=root_segment(pk),
+                    post_id=post, created=min(created, self.end),
+                    author_id=self.pick(self.users, 0),
+                    text=' '.join(self.rng.choices(
+                        WORDS, k=self.rng.randint(3, 15))))
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            return self.write('comments', Comment, rows(), count)
+
+    def create_follows(self, count, exponent):
+        """Подписки: подписчик выбирается равномерно, автор — по
+        популярности. Повторы пропускаются, поэтому подписок может
+        выйти немного меньше ``count``."""
+        before = Follow.objects.count()
+
+        def rows():
+            for _ in range(count):
+                user = self.pick(self.users, 0)
+                author = self.pick(self.users, exponent)
+                if user != author:
+                    yield Follow(user_id=user, author_id=author)
+
+        self.write('follows', Follow, rows(), count, ignore_conflicts=True)
+        return Follow.objects.count() - before
+
+
+def reset_sequences():
+    """После вставки с явными ключами счётчики автоинкремента в
+    PostgreSQL нужно передвинуть вручную; SQLite делает это сам."""
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [User, Group, Tag, Post, PostTag, Comment, Follow])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def rebuild_derived(batch_size=500, progress=None):
+    """Пересчитать то, что обычно поддерживают сигналы."""
+    progress = progress or (lambda label: None)
+    progress('counters')
+    counters.recount(batch_size=batch_size)
+    progress('timelines')
+    timeline.rebuild(batch_size=batch_size)
+    progress('search')
+    search.rebuild(batch_size=batch_size)
+    cache.bump(cache.FEED_SCOPE, cache.GROUPS_SCOPE)
@@ -0,0 +1,30 @@
+from django import template
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, page, direction=None):
+    """Ссылка на соседнюю страницу ленты с сохранением GET-параметров.
+
+    Для страниц ``CursorPaginator`` подставляется токен ``cursor``,
+    для обычного ``Paginator`` — номер страницы ``page``.
+    """
+    params = context['request'].GET.copy()
+    params.pop('page', None)
+    params.pop('cursor', None)
+    if direction == 'next':
+        cursor = getattr(page, 'next_cursor', None)
+        number = page.next_page_number
+    elif direction == 'previous':
+        cursor = getattr(page, 'previous_cursor', None)
+        number = page.previous_page_number
+    else:
+        cursor = number = None
+    if cursor:
+        params['cursor'] = cursor
+    elif number is not None:
+        params['page'] = number()
+    query = params.urlencode()
+    return f'?{query}' if query else context['request'].path
@@ -0,0 +1,25 @@
+from django import template
+
+from posts.cards import render_cards
+from posts.hashtags import linkify
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, comment_link=True):
+    """Карточки постов ленты из кэша карточек."""
+    return render_cards(posts, context.get('user'), comment_link)
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, comment_link=True):
+    return render_cards([post], context.get('user'), comment_link)
+
+
+@register.filter
+def link_tags(text, usernames=()):
+    """Ссылки на ленты #тегов и профили упомянутых @пользователей
+    из ``usernames`` в тексте."""
+    return linkify(text, usernames)
@@ -0,0 +1,136 @@
+import json
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+@override_settings(API_PAGE_SIZE=5)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testgroup',
+            description='Тестовое описание группы'
+        )
+        for i in range(7):
+            cls.post = Post.objects.create(
+                text=f'Тестовый текст {i}', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def texts(self, response):
+        return [post['text'] for post in response.json()['results']]
+
+    def test_feeds_paginate_by_cursor(self):
+        """Ленты отдаются страницами с курсором следующей страницы"""
+        for url in (reverse('api:index'),
+                    reverse('api:group', kwargs={'slug': 'testgroup'}),
+                    reverse('api:profile', kwargs={'username': 'testuser'})):
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                self.assertEqual(self.texts(first), [
+                    f'Тестовый текст {i}' for i in range(6, 1, -1)])
+                second = self.guest_client.get(
+                    url, {'cursor': first.json()['next']})
+                self.assertEqual(self.texts(second), [
+                    'Тестовый текст 1', 'Тестовый текст 0'])
+                self.assertIsNone(second.json()['next'])
+
+    def test_post_detail_and_not_found(self):
+        """Пост отдаётся по id, несуществующий — ошибкой 404 в JSON"""
+        response = self.guest_client.get(
+            reverse('api:post', kwargs={'post_id': self.post.pk}))
+        self.assertEqual(response.json()['author'], 'testuser')
+        self.assertEqual(response.json()['group'], 'testgroup')
+        response = self.guest_client.get(
+            reverse('api:post', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+
+    def test_unchanged_feed_returns_304(self):
+        """Неизменившаяся лента отвечает 304 по If-None-Match,
+        новый пост меняет ETag"""
+        url = reverse('api:index')
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.texts(response)[0], 'Новый пост')
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_no_etag_without_shared_cache(self):
+        """Поколениям из кэша одного процесса не верят"""
+        response = self.guest_client.get(reverse('api:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_comments(self):
+        """Комментарии создаёт только авторизованный пользователь,
+        новый комментарий меняет ETag списка"""
+        url = reverse('api:comments', kwargs={'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.post(
+            url, json.dumps({'text': 'Гость'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        response = self.authorized_client.post(
+            url, json.dumps({'text': 'Текст комментария'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = self.authorized_client.post(
+            url, json.dumps({'text': ''}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([comment['text'] for comment in
+                          response.json()['results']], ['Текст комментария'])
+        self.assertEqual(Comment.objects.get().author, self.reader)
+
+    def test_follow_and_follow_feed(self):
+        """Подписка и отписка через API, лента подписок с ETag"""
+        feed_url = reverse('api:follow_index')
+        self.assertEqual(self.guest_client.get(feed_url).status_code, 401)
+        follow_url = reverse('api:follow', kwargs={'username': 'testuser'})
+        self.assertEqual(
+            self.authorized_client.post(follow_url).status_code, 201)
+        self.assertEqual(
+            self.authorized_client.post(follow_url).status_code, 200)
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.user).exists())
+        response = self.authorized_client.get(feed_url)
+        self.assertEqual(len(self.texts(response)), 5)
+        response = self.authorized_client.get(
+            feed_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.authorized_client.delete(follow_url)
+        self.assertEqual(self.texts(self.authorized_client.get(feed_url)), [])
+        self.assertEqual(self.authorized_client.get(
+            follow_url).status_code, 405)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_feed_merges_pulled_authors(self):
+        """Посты крупных авторов подмешиваются в ленту подписок
+        и листаются тем же курсором"""
+        Follow.objects.create(user=self.reader, author=self.user)
+        star = User.objects.create_user(username='star')
+        Follow.objects.create(user=self.user, author=star)
+        Follow.objects.create(user=self.reader, author=star)
+        Post.objects.create(text='Пост звезды', author=star)
+        url = reverse('api:follow_index')
+        first = self.authorized_client.get(url)
+        second = self.authorized_client.get(
+            url, {'cursor': first.json()['next']})
+        self.assertEqual(self.texts(first) + self.texts(second), [
+            'Пост звезды'] + [f'Тестовый текст {i}' for i in range(6, -1, -1)])
@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts.benchmark import compare, measure, percentile, seed
+from posts.models import Follow, Post, User
+from posts.urls import urlpatterns
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_ASYNC=False)
+class BenchmarkTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.dataset = seed(users=6, groups=2, posts=30, comments=20)
+
+    def test_seed(self):
+        """Синтетические данные создаются в заданном объёме"""
+        self.assertEqual(User.objects.count(), 6)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Follow.objects.count(), self.dataset['follows'])
+        self.assertTrue(Post.objects.exclude(image='').exists())
+
+    def test_measure_covers_all_pages(self):
+        """Замеряется каждая страница posts/urls.py"""
+        results = measure(requests=2, warmup=0)
+        measured = {name.split(' ')[0] for name in results}
+        self.assertEqual(measured,
+                         {pattern.name for pattern in urlpatterns})
+        for result in results.values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_compare(self):
+        """Регрессией считаются лишние запросы и рост p50"""
+        baseline = {'index': {'p50_ms': 10, 'p99_ms': 20, 'queries': 3}}
+        self.assertEqual(compare(
+            {'index': {'p50_ms': 14, 'p99_ms': 50, 'queries': 3}},
+            baseline, 1.5), [])
+        self.assertEqual(len(compare(
+            {'index': {'p50_ms': 16, 'p99_ms': 20, 'queries': 4}},
+            baseline, 1.5)), 2)
+        self.assertEqual(compare(
+            {'group': {'p50_ms': 1, 'p99_ms': 2, 'queries': 1}},
+            baseline, 1.5), ['group: нет в базовом замере'])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
@@ -0,0 +1,61 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.cards import card_key, render_cards
+from posts.models import Group, Post, User
+
+
+class PostCardsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.user2 = User.objects.create_user(username='testuser2')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testgroup',
+            description='Тестовое описание группы'
+        )
+        for i in range(3):
+            Post.objects.create(
+                text=f'Тестовый текст {i}', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.edit_url = reverse('post_edit', kwargs={
+            'username': 'testuser', 'post_id': self.posts()[0].pk})
+
+    def posts(self):
+        return list(Post.objects.feed())
+
+    def test_cards_are_cached_per_post(self):
+        """Карточки кладутся в кэш по одной на пост"""
+        posts = self.posts()
+        render_cards(posts)
+        keys = [card_key(post, True) for post in posts]
+        self.assertEqual(len(cache.get_many(keys)), len(posts))
+
+    def test_edit_button_is_layered_for_author_only(self):
+        """Кнопка редактирования видна только автору,
+        хотя карточка в кэше одна"""
+        html = render_cards(self.posts(), AnonymousUser())
+        self.assertNotIn(self.edit_url, html)
+        html = render_cards(self.posts(), self.user2)
+        self.assertNotIn(self.edit_url, html)
+        html = render_cards(self.posts(), self.user)
+        self.assertIn(self.edit_url, html)
+
+    def test_card_version_follows_content(self):
+        """Правка поста или его группы меняет версию карточки"""
+        post = self.posts()[0]
+        version = post.card_version
+        Post.objects.filter(pk=post.pk).update(text='Новый текст')
+        self.assertNotEqual(self.posts()[0].card_version, version)
+        version = self.posts()[0].card_version
+        self.group.title = 'Новое название группы'
+        self.group.save()
+        self.assertNotEqual(self.posts()[0].card_version, version)
+        html = render_cards(self.posts())
+        self.assertIn('Новое название группы', html)
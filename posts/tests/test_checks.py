@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase, override_settings
+
+from posts.checks import check_deploy_cache, check_shared_cache
+
+LOCMEM = {'default': {'BACKEND': 'posts.metrics.MeteredLocMemCache'}}
+SQLITE = {'default': {'BACKEND': 'posts.metrics.MeteredSQLiteCache',
+                      'LOCATION': ':memory:'}}
+
+
+@override_settings(CACHES=LOCMEM)
+class CacheChecksTests(SimpleTestCase):
+    def ids(self, check):
+        return [error.id for error in check(None)]
+
+    def test_process_cache_with_one_worker(self):
+        self.assertEqual(self.ids(check_shared_cache), [])
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_process_cache_with_many_workers_fails(self):
+        """Кэш в памяти процесса запрещён при нескольких воркерах"""
+        self.assertEqual(self.ids(check_shared_cache), ['posts.E001'])
+        with self.settings(CACHES=SQLITE):
+            self.assertEqual(self.ids(check_shared_cache), [])
+
+    def test_process_cache_without_debug_fails_deploy_check(self):
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.ids(check_deploy_cache), [])
+        with self.settings(DEBUG=False):
+            self.assertEqual(self.ids(check_deploy_cache), ['posts.E002'])
+            with self.settings(CACHES=SQLITE):
+                self.assertEqual(self.ids(check_deploy_cache), [])
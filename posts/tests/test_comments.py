@@ -0,0 +1,109 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.comments import comment_page, path_ids, reply_parent
+from posts.models import Comment, Post, User
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0, COMMENTS_MAX_DEPTH=4,
+                   COMMENTS_THREAD_DEPTH=2)
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def comment(self, text, parent=None):
+        return Comment.objects.create(text=text, post=self.post,
+                                      author=self.user, parent=parent)
+
+    def refresh(self, *comments):
+        for comment in comments:
+            comment.refresh_from_db()
+
+    def test_threads_are_ordered_by_path(self):
+        """Новые ветки сверху, ответы под своими родителями по порядку"""
+        first = self.comment('первый')
+        second = self.comment('второй')
+        reply = self.comment('ответ первому', first)
+        nested = self.comment('ответ на ответ', reply)
+        late = self.comment('поздний ответ второму', second)
+        ordered = list(self.post.comments.order_by('path'))
+        self.assertEqual(ordered, [second, late, first, reply, nested])
+        self.refresh(nested)
+        self.assertEqual(nested.depth, 2)
+        self.assertEqual(path_ids(nested.path),
+                         [first.pk, reply.pk, nested.pk])
+
+    def test_replies_count_covers_subtree(self):
+        """Счётчик ответов учитывает вложенные ответы и удаление"""
+        root = self.comment('корень')
+        reply = self.comment('ответ', root)
+        nested = self.comment('ответ на ответ', reply)
+        self.refresh(root, reply)
+        self.assertEqual((root.replies_count, reply.replies_count), (2, 1))
+        reply.delete()
+        self.refresh(root)
+        self.assertEqual(root.replies_count, 0)
+        self.assertFalse(Comment.objects.filter(pk=nested.pk).exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_replies_beyond_max_depth_go_to_ancestor(self):
+        """Ответ глубже предела прикрепляется к предку на пределе"""
+        comment = self.comment('0')
+        chain = [comment]
+        for level in range(1, 5):
+            comment = self.comment(str(level), comment)
+            chain.append(comment)
+        self.assertEqual(comment.depth, 4)
+        self.assertEqual(reply_parent(self.post, comment.pk), chain[3])
+        self.assertEqual(reply_parent(self.post, chain[2].pk), chain[2])
+        self.assertIsNone(reply_parent(self.post, 'abc'))
+
+    def test_deep_replies_are_collapsed(self):
+        """На странице видны два уровня, глубже — ссылка со счётчиком"""
+        root = self.comment('корень')
+        reply = self.comment('ответ', root)
+        hidden = self.comment('скрытый ответ', reply)
+        self.comment('ещё скрытый', hidden)
+        url = reverse('post', kwargs={'username': 'testuser',
+                                      'post_id': self.post.pk})
+        response = self.authorized_client.get(url)
+        self.assertEqual(list(response.context['comments']), [root, reply])
+        self.assertContains(response, f'?thread={reply.pk}')
+        self.assertContains(response, 'Ещё ответов: 2')
+        response = self.authorized_client.get(url, {'thread': reply.pk})
+        self.assertEqual(list(response.context['comments']),
+                         [reply, hidden])
+        self.assertNotContains(response, 'корень')
+
+    def test_subtree_is_read_with_one_query(self):
+        """Ветка с авторами читается одним запросом"""
+        root = self.comment('корень')
+        for i in range(3):
+            reply = self.comment(f'ответ {i}', root)
+            self.comment(f'ответ на ответ {i}', reply)
+        with self.settings(COMMENTS_THREAD_DEPTH=5):
+            page = comment_page(self.post, root=root)
+            with self.assertNumQueries(1):
+                usernames = [comment.author.username for comment in page]
+        self.assertEqual(len(usernames), 7)
+
+    def test_reply_is_posted_from_page(self):
+        """Ответ из формы попадает под выбранный комментарий"""
+        root = self.comment('корень')
+        url = reverse('add_comment', kwargs={'username': 'testuser',
+                                             'post_id': self.post.pk})
+        response = self.authorized_client.get(url, {'reply': root.pk})
+        self.assertContains(response, f'name="parent" value="{root.pk}"')
+        self.authorized_client.post(url, {'text': 'ответ', 'parent': root.pk})
+        reply = Comment.objects.get(text='ответ')
+        self.assertEqual(reply.parent, root)
+        self.assertEqual(reply.depth, 1)
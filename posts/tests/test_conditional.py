@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+
+
+class ConditionalPageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testgroup',
+            description='Тестовое описание группы'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def urls(self):
+        return [
+            reverse('index'),
+            reverse('group', kwargs={'slug': 'testgroup'}),
+            reverse('profile', kwargs={'username': 'testuser'}),
+            reverse('post', kwargs={'username': 'testuser',
+                                    'post_id': self.post.pk}),
+        ]
+
+    def test_unchanged_page_returns_304(self):
+        """Повторный запрос неизменившейся страницы отвечает 304
+        без отрисовки шаблонов"""
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                with self.assertTemplateNotUsed('base.html'):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                response = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_index_revalidation_skips_database(self):
+        """Перепроверка главной страницы не обращается к базе"""
+        etag = self.guest_client.get(reverse('index'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(
+                reverse('index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_validators(self):
+        """Правка поста и подписка меняют ETag затронутых страниц"""
+        etags = {url: self.guest_client.get(url)['ETag']
+                 for url in self.urls()}
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        url = reverse('profile', kwargs={'username': 'testuser'})
+        etag = self.guest_client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_authorized_pages_are_private(self):
+        """Страницы авторизованного пользователя не кэшируются CDN
+        и имеют свой ETag"""
+        url = reverse('index')
+        guest_etag = self.guest_client.get(url)['ETag']
+        response = self.authorized_client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotEqual(response['ETag'], guest_etag)
+        response = self.authorized_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_no_validators_without_shared_cache(self):
+        """Без общего кэша страницы отдаются целиком, без ETag"""
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH='*')
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('ETag', response)
@@ -0,0 +1,84 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Post, ProfileStats, User
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.user2 = User.objects.create_user(username='testuser2')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def stats(self, user):
+        return ProfileStats.objects.get(user=user)
+
+    def test_post_counter(self):
+        """Счётчик постов меняется при создании и удалении поста"""
+        post = Post.objects.create(text='Ещё один пост', author=self.user)
+        self.assertEqual(self.stats(self.user).posts_count, 2)
+        post.delete()
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+
+    def test_comment_counter(self):
+        """Счётчик комментариев поста меняется при создании
+        и удалении комментария"""
+        comment = Comment.objects.create(
+            text='Текст комментария', post=self.post, author=self.user2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_follow_counters(self):
+        """Счётчики подписок меняются при подписке и отписке"""
+        Follow.objects.create(user=self.user2, author=self.user)
+        self.assertEqual(self.stats(self.user).followers_count, 1)
+        self.assertEqual(self.stats(self.user2).following_count, 1)
+        Follow.objects.filter(user=self.user2, author=self.user).delete()
+        self.assertEqual(self.stats(self.user).followers_count, 0)
+        self.assertEqual(self.stats(self.user2).following_count, 0)
+
+    def test_deleted_follower_releases_counter(self):
+        """Удаление подписчика уменьшает счётчик подписчиков автора"""
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.user)
+        follower.delete()
+        self.assertEqual(self.stats(self.user).followers_count, 0)
+
+    def test_author_with_posts_can_be_deleted(self):
+        """Удаление автора вместе с постами не создаёт ему счётчики
+        заново"""
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост автора', author=author)
+        author.delete()
+        self.assertFalse(ProfileStats.objects.filter(
+            user_id=author.pk).exists())
+
+    def test_recount_stats_repairs_drift(self):
+        """Команда recount_stats исправляет расхождения счётчиков"""
+        Follow.objects.create(user=self.user2, author=self.user)
+        Comment.objects.create(
+            text='Текст комментария', post=self.post, author=self.user2)
+        ProfileStats.objects.filter(user=self.user).update(
+            posts_count=10, followers_count=0)
+        ProfileStats.objects.filter(user=self.user2).delete()
+        Post.objects.filter(pk=self.post.pk).update(comment_count=5)
+        out = StringIO()
+        call_command('recount_stats', stdout=out)
+        self.assertIn('Профилей без счётчиков: 1', out.getvalue())
+        self.assertIn('Постов с расхождениями: 1', out.getvalue())
+        stats = self.stats(self.user)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(self.stats(self.user2).following_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        out = StringIO()
+        call_command('recount_stats', '--dry-run', stdout=out)
+        self.assertIn('Профилей с расхождениями: 0', out.getvalue())
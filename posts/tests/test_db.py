@@ -0,0 +1,76 @@
+import shutil
+import tempfile
+import threading
+
+from django.db import connections, transaction
+from django.test import SimpleTestCase
+
+WRITERS = 8
+TRANSACTIONS = 25
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    """Бэкенд yatube.db на файле базы, общем для нескольких потоков"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        connections.databases['concurrent'] = {
+            **connections.databases['default'],
+            'ENGINE': 'yatube.db',
+            'NAME': f'{directory}/db.sqlite3',
+            'OPTIONS': {'timeout': 30},
+        }
+        self.addCleanup(connections.databases.pop, 'concurrent')
+        self.addCleanup(connections.__delitem__, 'concurrent')
+        self.addCleanup(self.close)
+        with connections['concurrent'].cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (value INTEGER)')
+            cursor.execute('CREATE TABLE entry (writer INTEGER)')
+            cursor.execute('INSERT INTO counter VALUES (0)')
+
+    def close(self):
+        connections['concurrent'].close()
+
+    def write(self, writer, errors):
+        """Транзакции «прочитать, затем записать», как add_comment с
+        пересчётом comment_count."""
+        try:
+            for _ in range(TRANSACTIONS):
+                with transaction.atomic(using='concurrent'):
+                    with connections['concurrent'].cursor() as cursor:
+                        cursor.execute('SELECT value FROM counter')
+                        value, = cursor.fetchone()
+                        cursor.execute('INSERT INTO entry VALUES (%s)',
+                                       [writer])
+                        cursor.execute('UPDATE counter SET value = %s',
+                                       [value + 1])
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            self.close()
+
+    def test_pragmas_are_applied(self):
+        """Соединение открывается в режиме WAL с synchronous=NORMAL"""
+        with connections['concurrent'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_parallel_writers_are_not_locked(self):
+        """Параллельные пишущие транзакции ждут друг друга, а не падают
+        с «database is locked», и не теряют обновлений"""
+        errors = []
+        threads = [threading.Thread(target=self.write, args=(i, errors))
+                   for i in range(WRITERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        with connections['concurrent'].cursor() as cursor:
+            cursor.execute('SELECT value FROM counter')
+            self.assertEqual(cursor.fetchone()[0], WRITERS * TRANSACTIONS)
+            cursor.execute('SELECT COUNT(*) FROM entry')
+            self.assertEqual(cursor.fetchone()[0], WRITERS * TRANSACTIONS)
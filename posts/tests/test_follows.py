@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.counters import actual_counters, drifted
+from posts.follows import follow_pairs, unfollow_pairs
+from posts.models import Follow, Post, TimelineEntry, User
+
+
+class BatchFollowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [User.objects.create_user(username=f'author{i}')
+                       for i in range(6)]
+        for author in cls.authors:
+            Post.objects.create(text=f'Пост {author.username}', author=author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def assertCountersConsistent(self):
+        for model, counters in actual_counters().items():
+            self.assertFalse(drifted(model, counters).exists())
+
+    def pairs(self, count):
+        return [(self.reader.pk, author.pk) for author in self.authors[:count]]
+
+    def test_follow_and_unfollow_keep_derived_data(self):
+        """Счётчики и лента подписок соответствуют подпискам"""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        created = follow_pairs(
+            self.pairs(4) + [(self.reader.pk, self.reader.pk)])
+        self.assertEqual(created, 3)
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 4)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.reader).count(), 4)
+        self.assertCountersConsistent()
+        self.assertEqual(unfollow_pairs(self.pairs(6)), 4)
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertCountersConsistent()
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        """Пачка подписок пишется фиксированным числом запросов"""
+        for count in (2, 6):
+            with self.subTest(count=count):
+                with self.assertNumQueries(12):
+                    follow_pairs(self.pairs(count))
+                with self.assertNumQueries(8):
+                    unfollow_pairs(self.pairs(count))
+
+    def test_batch_with_many_followers(self):
+        """Пачка с тысячами подписчиков не упирается в предел глубины
+        выражения SQLite"""
+        User.objects.bulk_create(
+            User(username=f'fan{i}') for i in range(1200))
+        fans = User.objects.filter(username__startswith='fan').values_list(
+            'pk', flat=True)
+        author = self.authors[0].pk
+        pairs = [(fan, author) for fan in fans]
+        self.assertEqual(follow_pairs(pairs), 1200)
+        self.assertEqual(TimelineEntry.objects.count(), 1200)
+        self.assertEqual(follow_pairs(pairs), 0)
+        self.assertEqual(unfollow_pairs(pairs), 1200)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertCountersConsistent()
+
+    def test_follow_many_view(self):
+        """Форма подписывает на несколько авторов сразу"""
+        response = self.authorized_client.post(reverse('follow_many'), {
+            'authors': ['author0', 'author1', 'unknown'],
+            'next': reverse('profile', kwargs={'username': 'author1'})})
+        self.assertRedirects(
+            response, reverse('profile', kwargs={'username': 'author1'}))
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 2)
+        response = self.authorized_client.post(reverse('follow_many'), {
+            'authors': ['author0'], 'action': 'unfollow',
+            'next': 'https://example.com/'})
+        self.assertRedirects(response, reverse('follow_index'))
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 1)
+
+    @override_settings(FOLLOW_BATCH_LIMIT=3)
+    def test_follow_many_api(self):
+        url = reverse('api:follow_many')
+        response = self.authorized_client.post(
+            url, json.dumps({'authors': ['author0', 'author1']}),
+            content_type='application/json')
+        self.assertEqual(response.json(), {'followed': 2})
+        response = self.authorized_client.delete(
+            url, json.dumps({'authors': ['author1', 'author2']}),
+            content_type='application/json')
+        self.assertEqual(response.json(), {'unfollowed': 1})
+        response = self.authorized_client.post(
+            url, json.dumps({'authors': ['author0'] * 4}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = Client().post(url, {'authors': ['author0']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_import_command(self):
+        """Команда импортирует граф подписок из CSV пачками"""
+        rows = ['follower,author', 'reader,author0', 'reader,author1',
+                'author0,author1', 'author1,unknown', '', 'author2,author0']
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.csv', delete=False) as source:
+            source.write('\n'.join(rows))
+        self.addCleanup(os.remove, source.name)
+        out = StringIO()
+        call_command('import_follows', source.name, batch_size=2, stdout=out)
+        self.assertIn('Создано подписок: 4, пропущено строк: 2',
+                      out.getvalue())
+        self.assertEqual(Follow.objects.count(), 4)
+        self.assertCountersConsistent()
+        call_command('import_follows', source.name, unfollow=True,
+                     stdout=out)
+        self.assertIn('Удалено подписок: 4', out.getvalue())
+        self.assertFalse(Follow.objects.exists())
+        self.assertCountersConsistent()
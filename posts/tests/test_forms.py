@@ -1,16 +1,33 @@
+import io
+import os
 import shutil
+import struct
 import tempfile
+import zlib
+from unittest import mock
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from http import HTTPStatus
+from PIL import Image
 
+from posts import thumbnails
 from posts.models import Post, User, Comment
+from posts.uploads import upload_dir
 
 
 class PostFormTests(TestCase):
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -66,6 +83,134 @@ class PostFormTests(TestCase):
             text='Тестовый текст 2', author=PostFormTests.user,).exists()
         )
 
+    def test_postform_prepares_thumbnail(self):
+        """После сохранения картинки готовится миниатюра,
+        и лента показывает её вместо заглушки"""
+        uploaded = SimpleUploadedFile(
+            name='small.gif',
+            content=self.small_gif,
+            content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertTrue(post.image_thumbnail)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, post.image_thumbnail_url)
+
+    @override_settings(RENDITION_PROCESSES=2)
+    def test_postform_prepares_renditions(self):
+        """Для картинки готовятся варианты всех ширин,
+        и карточка выводит их в srcset"""
+        uploaded = SimpleUploadedFile(
+            name='small.gif',
+            content=self.small_gif,
+            content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        jpeg = post.renditions.filter(format='jpeg')
+        self.assertEqual(list(jpeg.values_list('width', flat=True)),
+                         list(settings.POST_RENDITION_WIDTHS))
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, f'{jpeg.last().url} 960w')
+
+    @override_settings(THUMBNAIL_ASYNC=True)
+    def test_postform_shows_placeholder_until_thumbnail_is_ready(self):
+        """Пока миниатюра не готова, в ленте выводится заглушка,
+        после фоновой задачи — миниатюра"""
+        uploaded = SimpleUploadedFile(
+            name='small.gif',
+            content=self.small_gif,
+            content_type='image/gif'
+        )
+        # В TestCase транзакция не коммитится, поэтому задача из
+        # on_commit перехватывается и запускается здесь же
+        with mock.patch('posts.thumbnails.transaction.on_commit') as on_commit:
+            self.authorized_client.post(
+                reverse('new_post'),
+                data={'text': 'Пост с картинкой', 'image': uploaded},
+            )
+        on_commit.assert_called_once()
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertEqual(post.image_thumbnail, '')
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Изображение обрабатывается')
+
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        self.assertTrue(post.image_thumbnail)
+        self.assertTrue(os.path.exists(
+            os.path.join(settings.MEDIA_ROOT, post.image_thumbnail)))
+        response = self.guest_client.get(reverse('index'))
+        self.assertNotContains(response, 'Изображение обрабатывается')
+        self.assertContains(response, post.image_thumbnail_url)
+
+    def assert_upload_rejected(self, uploaded, message):
+        posts_count = Post.objects.count()
+        response = self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertFormError(response, 'form', 'image', message)
+        # Временный файл отклонённой загрузки удалён
+        self.assertEqual(os.listdir(upload_dir()), [])
+
+    def test_image_handler_keeps_csrf_check(self):
+        """Форма поста с обработчиком картинок проверяет CSRF-токен"""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('new_post'), {'text': 'Без токена'})
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=16)
+    def test_postform_rejects_large_file(self):
+        """Файл больше POST_IMAGE_MAX_UPLOAD_SIZE отклоняется"""
+        uploaded = SimpleUploadedFile('small.gif', self.small_gif,
+                                      content_type='image/gif')
+        self.assert_upload_rejected(
+            uploaded, 'Размер файла больше 16\xa0байт.')
+
+    def test_postform_rejects_decompression_bomb(self):
+        """Картинка с огромным разрешением отклоняется по заголовку"""
+        header = struct.pack('>IIBBBBB', 100000, 100000, 8, 2, 0, 0, 0)
+        ihdr = (struct.pack('>I', len(header)) + b'IHDR' + header
+                + struct.pack('>I', zlib.crc32(b'IHDR' + header)))
+        uploaded = SimpleUploadedFile(
+            'bomb.png', b'\x89PNG\r\n\x1a\n' + ihdr, content_type='image/png')
+        self.assert_upload_rejected(
+            uploaded, 'Слишком большое разрешение картинки.')
+
+    def test_postform_rejects_non_image(self):
+        """Файл без сигнатуры картинки отклоняется"""
+        uploaded = SimpleUploadedFile('small.gif', b'<html></html>' * 10,
+                                      content_type='image/gif')
+        self.assert_upload_rejected(
+            uploaded, 'Загрузите картинку в формате JPEG, PNG или GIF.')
+
+    def test_postform_strips_exif(self):
+        """Из сохранённой картинки вырезаются метаданные EXIF"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Тестовая камера'
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(buffer, 'JPEG', exif=exif.tobytes())
+        uploaded = SimpleUploadedFile('photo.jpg', buffer.getvalue(),
+                                      content_type='image/jpeg')
+        self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'Пост с фотографией', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Пост с фотографией')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (8, 8))
+            self.assertNotIn('exif', image.info)
+
     def test_postform_guest_doesnt_create_post(self):
         """Форма new_post не создает новую запись в модели
         для неавторизированного пользователя"""
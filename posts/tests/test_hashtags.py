@@ -0,0 +1,68 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.hashtags import extract_mentions, extract_tags
+from posts.models import Mention, Post, PostTag, User
+
+
+class HashtagTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.friend = User.objects.create_user(username='friend')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_extracts_tags_and_mentions(self):
+        """Из текста извлекаются теги без повторов и упоминания"""
+        text = 'Утро #Кофе и #кофе, привет @friend! Почта a@b.c, цвет #fff'
+        self.assertEqual(extract_tags(text), ['кофе', 'fff'])
+        self.assertEqual(extract_mentions(text), ['friend'])
+
+    def test_post_save_updates_links(self):
+        """Теги и упоминания поста обновляются при сохранении,
+        упоминания несуществующих пользователей не сохраняются"""
+        post = Post.objects.create(
+            text='#кофе для @friend и @nobody', author=self.user)
+        self.assertEqual(list(PostTag.objects.filter(post=post).values_list(
+            'tag__name', flat=True)), ['кофе'])
+        self.assertEqual(list(Mention.objects.values_list(
+            'user__username', flat=True)), ['friend'])
+        post.text = '#чай без упоминаний'
+        post.save()
+        self.assertEqual(list(PostTag.objects.filter(post=post).values_list(
+            'tag__name', flat=True)), ['чай'])
+        self.assertFalse(Mention.objects.exists())
+
+    def test_tag_page_paginates(self):
+        """Лента тега выводит только посты с тегом и делится
+        на страницы курсором"""
+        Post.objects.create(text='Без тега', author=self.user)
+        for i in range(12):
+            Post.objects.create(text=f'Пост {i} #кофе', author=self.user)
+        url = reverse('tag', kwargs={'name': 'Кофе'})
+        first = self.guest_client.get(url)
+        self.assertEqual([post.text for post in first.context['page']],
+                         [f'Пост {i} #кофе' for i in range(11, 1, -1)])
+        second = self.guest_client.get(
+            url, {'cursor': first.context['page'].next_cursor})
+        self.assertEqual([post.text for post in second.context['page']],
+                         ['Пост 1 #кофе', 'Пост 0 #кофе'])
+        self.assertEqual(self.guest_client.get(
+            reverse('tag', kwargs={'name': 'чай'})).status_code, 404)
+
+    def test_post_text_links_tags_and_mentions(self):
+        """В карточке поста теги и упоминания становятся ссылками"""
+        Post.objects.create(text='#кофе для @friend и @nobody <b>',
+                            author=self.user)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(
+            response, f'<a href="{reverse("tag", args=["кофе"])}">#кофе</a>')
+        self.assertContains(
+            response, f'<a href="{reverse("profile", args=["friend"])}">'
+                      f'@friend</a>')
+        self.assertNotContains(
+            response, reverse('profile', args=['nobody']))
+        self.assertContains(response, '&lt;b&gt;')
@@ -0,0 +1,95 @@
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template import engines
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.metrics import MetricsMiddleware, query_shape, registry
+from posts.models import Post, User
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.guest_client = Client()
+
+    def timing(self, response):
+        return dict(
+            part.split(';', 1) for part in
+            response['Server-Timing'].split(', '))
+
+    def test_server_timing_header(self):
+        """Ответ содержит время SQL, шаблонов и попадания в кэш"""
+        url = reverse('post', kwargs={'username': 'testuser',
+                                      'post_id': self.post.pk})
+        self.guest_client.get(url)
+        response = self.guest_client.get(url)
+        timing = self.timing(response)
+        self.assertEqual(set(timing), {'sql', 'tpl', 'cache', 'total'})
+        self.assertRegex(timing['sql'], r'^dur=[\d.]+;desc="\d+ queries"$')
+        self.assertRegex(timing['tpl'], r'^dur=[\d.]+$')
+        self.assertRegex(timing['cache'], r'^desc="hits=[1-9]\d* misses=\d+"$')
+
+    def test_prometheus_endpoint(self):
+        """Счётчики копятся по представлениям и отдаются Prometheus"""
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('index'))
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        self.assertIn('# TYPE yatube_requests_total counter', text)
+        self.assertIn('yatube_requests_total{view="index"} 2', text)
+        self.assertRegex(text, r'yatube_sql_queries_total\{view="index"\} ')
+
+    def test_prometheus_endpoint_is_internal(self):
+        """Снаружи страница метрик не видна"""
+        response = self.guest_client.get(reverse('metrics'),
+                                         REMOTE_ADDR='203.0.113.1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_repeated_queries_are_logged(self):
+        """Повторяющиеся запросы одного вида попадают в лог как N+1"""
+        def view(request):
+            for pk in range(5):
+                list(Post.objects.filter(pk__in=range(pk + 2)))
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(view)
+        with self.assertLogs('posts.metrics', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('5 раз', logs.output[0])
+        self.assertIn('IN (%s, ...)', logs.output[0])
+
+    def test_nested_templates_are_timed_once(self):
+        """Шаблон, отрисованный внутри другого, не добавляет своё
+        время второй раз"""
+        engine = engines.all()[0]
+        inner = engine.from_string('{{ slow }}')
+
+        def view(request):
+            outer = engine.from_string('{{ inner }}')
+            return HttpResponse(outer.render({'inner': lambda: inner.render(
+                {'slow': lambda: time.sleep(0.05)})}))
+
+        response = MetricsMiddleware(view)(RequestFactory().get('/'))
+        timing = self.timing(response)
+        template = float(timing['tpl'].split('=')[1])
+        total = float(timing['total'].split('=')[1])
+        self.assertGreaterEqual(template, 50)
+        self.assertLessEqual(template, total)
+
+    def test_query_shape(self):
+        self.assertEqual(
+            query_shape('SELECT 1 WHERE id IN (%s, %s, %s) AND x = %s'),
+            'SELECT 1 WHERE id IN (%s, ...) AND x = %s')
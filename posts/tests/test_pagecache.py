@@ -0,0 +1,77 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.pagecache import LOCK_KEY, PAGE_KEY, fetch, page_key
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_anonymous_page_is_cached(self):
+        """Повторный анонимный запрос отдаётся из кэша без запросов
+        к базе, авторизованный — отрисовывается заново"""
+        url = reverse('index')
+        first = self.guest_client.get(url)
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            second = self.guest_client.get(url)
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        response = self.authorized_client.get(url)
+        self.assertNotIn('X-Page-Cache', response)
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_disabled_without_shared_cache(self):
+        """Без общего кэша страница всегда отрисовывается заново"""
+        request = RequestFactory().get(reverse('index'))
+        render = mock.Mock(return_value=HttpResponse('page'))
+        for _ in range(2):
+            response = fetch(request, '"v1"', 'now', render)
+            self.assertNotIn('X-Page-Cache', response)
+        self.assertEqual(render.call_count, 2)
+        self.assertIsNone(cache.get(PAGE_KEY.format(page_key(request))))
+
+    def test_stale_page_is_served_while_other_worker_regenerates(self):
+        """Пока устаревшую страницу пересчитывает другой процесс,
+        отдаётся старая копия со своим ETag"""
+        url = reverse('index')
+        old = self.guest_client.get(url)
+        lock = LOCK_KEY.format(page_key(old.wsgi_request))
+        Post.objects.create(text='Новый пост', author=self.user)
+        cache.add(lock, 1)
+        response = self.guest_client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'stale')
+        self.assertNotContains(response, 'Новый пост')
+        self.assertEqual(response['ETag'], old['ETag'])
+        cache.delete(lock)
+        response = self.guest_client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Новый пост')
+
+    @override_settings(PAGE_CACHE_BETA=10 ** 9)
+    def test_page_is_refreshed_early(self):
+        """Свежая страница иногда пересчитывается до истечения срока"""
+        url = reverse('index')
+        self.guest_client.get(url)
+        with mock.patch('posts.pagecache.random.random', return_value=0.0):
+            self.assertEqual(self.guest_client.get(url)['X-Page-Cache'], 'hit')
+        with mock.patch('posts.pagecache.random.random',
+                        return_value=1 - 2 ** -53):
+            response = self.guest_client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
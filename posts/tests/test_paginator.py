@@ -0,0 +1,87 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+from posts.paginator import CursorPaginator
+
+
+# Тестам нужен контекст шаблона, кэш целых страниц его не сохраняет
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testgroup',
+            description='Тестовое описание группы'
+        )
+        for i in range(25):
+            Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=cls.user,
+                group=cls.group,
+            )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def walk_forward(self, url):
+        """Пройти ленту по ссылкам «Следующая» и собрать id постов."""
+        seen = []
+        response = self.guest_client.get(url)
+        while True:
+            page = response.context['page']
+            seen.extend(post.id for post in page)
+            if not page.has_next():
+                return seen
+            response = self.guest_client.get(
+                url, {'cursor': page.next_cursor})
+
+    def test_cursor_pages_cover_feed_in_order(self):
+        """Курсорные страницы проходят всю ленту без пропусков
+        и повторов в порядке убывания даты"""
+        expected = list(Post.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+        for url in (reverse('index'),
+                    reverse('group', kwargs={'slug': 'testgroup'}),
+                    reverse('profile', kwargs={'username': 'testuser'})):
+            with self.subTest(url=url):
+                self.assertEqual(self.walk_forward(url), expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Ссылка «Предыдущая» возвращает ту же страницу,
+        с которой пришли"""
+        url = reverse('index')
+        first = self.guest_client.get(url).context['page']
+        second = self.guest_client.get(
+            url, {'cursor': first.next_cursor}).context['page']
+        back = self.guest_client.get(
+            url, {'cursor': second.previous_cursor}).context['page']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Некорректный курсор отдаёт первую страницу"""
+        response = self.guest_client.get(reverse('index'),
+                                         {'cursor': 'не-курсор'})
+        page = response.context['page']
+        self.assertEqual(len(page), 10)
+        self.assertFalse(page.has_previous())
+
+    def test_cursor_page_does_not_count(self):
+        """Курсорная страница не выполняет COUNT(*)"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        with self.assertNumQueries(1):
+            page = paginator.get_cursor_page()
+            self.assertTrue(page.has_other_pages())
+
+    @override_settings(POSTS_APPROXIMATE_COUNT=True, POSTS_COUNT_LIMIT=20)
+    def test_approximate_count_is_capped(self):
+        """Приблизительный подсчёт ограничен POSTS_COUNT_LIMIT"""
+        response = self.guest_client.get(reverse('index'))
+        paginator = response.context['page'].paginator
+        self.assertTrue(paginator.count_is_capped)
+        self.assertContains(response, 'Записей: более 20')
@@ -0,0 +1,117 @@
+import re
+import unittest
+
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class QueryRecorder:
+    """Запоминает SQL и параметры запросов для EXPLAIN QUERY PLAN."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite',
+                     'EXPLAIN QUERY PLAN есть только у SQLite')
+class QueryPlanTests(TestCase):
+    # Таблицы, которые растут вместе с лентами; полный просмотр или
+    # сортировка во временном B-дереве на них недопустимы. Справочник
+    # групп целиком выводится в форме поста и в проверку не входит.
+    tables = re.compile(
+        r'"posts_(post|comment|follow|timelineentry|posttag|mention'
+        r'|searchterm)"')
+    bad_plan = re.compile(
+        r'^SCAN (TABLE )?posts_'
+        r'(post|comment|follow|timelineentry|posttag|mention|searchterm)'
+        r'( AS \w+)?$|TEMP B-TREE FOR ORDER BY')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.user2 = User.objects.create_user(username='testuser2')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testgroup',
+            description='Тестовое описание группы'
+        )
+        Follow.objects.create(user=cls.user2, author=cls.user)
+        for i in range(15):
+            post = Post.objects.create(
+                text=f'Тестовый текст {i} #тест', author=cls.user,
+                group=cls.group)
+            Comment.objects.create(
+                text='Текст комментария', post=post, author=cls.user2)
+        cls.post = post
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user2)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def urls(self):
+        """Пары (клиент, адрес) для GET и тройки (клиент, адрес,
+        данные) для POST."""
+        post_kwargs = {'username': 'testuser', 'post_id': self.post.pk}
+        return [
+            (self.guest_client, reverse('index')),
+            (self.guest_client, reverse('index') + '?page=2'),
+            (self.guest_client,
+             reverse('group', kwargs={'slug': 'testgroup'})),
+            (self.guest_client,
+             reverse('profile', kwargs={'username': 'testuser'})),
+            (self.guest_client, reverse('tag', kwargs={'name': 'тест'})),
+            (self.guest_client,
+             reverse('tag', kwargs={'name': 'тест'}) + '?page=2'),
+            (self.guest_client, reverse('post', kwargs=post_kwargs)),
+            (self.guest_client,
+             reverse('post_comments', kwargs=post_kwargs)),
+            (self.guest_client, reverse('search') + '?q=текст'),
+            (self.guest_client, reverse('search') + '?q=текст&page=2'),
+            (self.authorized_client, reverse('follow_index')),
+            (self.authorized_client, reverse('new_post')),
+            (self.authorized_client, reverse('add_comment',
+                                             kwargs=post_kwargs)),
+            (self.authorized_client, reverse(
+                'profile_unfollow', kwargs={'username': 'testuser'})),
+            (self.authorized_client, reverse(
+                'profile_follow', kwargs={'username': 'testuser'})),
+            (self.authorized_client, reverse('follow_many'),
+             {'authors': ['testuser'], 'action': 'unfollow'}),
+            (self.authorized_client, reverse('follow_many'),
+             {'authors': ['testuser']}),
+            (self.staff_client, reverse('metrics')),
+        ]
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_views_do_not_scan_post_tables(self):
+        """Запросы страниц не просматривают таблицы posts_* целиком"""
+        for client, url, *data in self.urls():
+            recorder = QueryRecorder()
+            with connection.execute_wrapper(recorder):
+                if data:
+                    client.post(url, data[0])
+                else:
+                    client.get(url)
+            for sql, params in recorder.queries:
+                if not sql.startswith('SELECT') or not self.tables.search(
+                        sql):
+                    continue
+                for step in self.explain(sql, params):
+                    with self.subTest(url=url, sql=sql):
+                        self.assertIsNone(self.bad_plan.search(step), step)
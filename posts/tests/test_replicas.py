@@ -0,0 +1,113 @@
+import shutil
+import sqlite3
+import tempfile
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, ProfileStats, User
+from posts.replicas import PIN_COOKIE, ReplicaRouter
+
+
+@override_settings(REPLICA_DATABASES=['replica'], REPLICA_MAX_LAG=0,
+                   PAGE_CACHE_TIMEOUT=0)
+class ReplicaRoutingTests(TestCase):
+    """Основная база — тестовая, реплика — её снимок в отдельном файле,
+    который после снимка не обновляется, то есть «отстаёт»"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Снимок схемы снимается до транзакции, в которой идёт тест
+        cls.directory = tempfile.mkdtemp()
+        cls.schema = f'{cls.directory}/schema.sqlite3'
+        connection.ensure_connection()
+        snapshot = sqlite3.connect(cls.schema)
+        connection.connection.backup(snapshot)
+        snapshot.close()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(text='Старый пост', author=cls.author,
+                            group=cls.group)
+
+    def setUp(self):
+        path = f'{self.directory}/{self._testMethodName}.sqlite3'
+        shutil.copy(self.schema, path)
+        connections.databases['replica'] = {
+            **connections.databases['default'], 'NAME': path}
+        self.addCleanup(connections.databases.pop, 'replica')
+        self.addCleanup(connections.__delitem__, 'replica')
+        self.addCleanup(lambda: connections['replica'].close())
+        self.replicate()
+        Post.objects.create(text='Новый пост', author=self.author,
+                            group=self.group)
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def replicate(self):
+        """Перенести на реплику текущее содержимое основной базы"""
+        for model in (User, ProfileStats, Group, Post):
+            model.objects.using('replica').bulk_create(model.objects.all())
+
+    def test_feeds_are_read_from_replica(self):
+        """Ленты читаются с реплики, которая ещё не знает новый пост"""
+        urls = [
+            reverse('index'),
+            reverse('group', kwargs={'slug': 'group'}),
+            reverse('profile', kwargs={'username': 'author'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Старый пост')
+                self.assertNotContains(response, 'Новый пост')
+
+    @override_settings(REPLICA_MAX_LAG=60)
+    def test_recently_changed_pages_are_read_from_primary(self):
+        """Страница, данные которой только что менялись, собирается по
+        основной базе"""
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Новый пост')
+
+    @override_settings(REPLICA_MAX_LAG=60)
+    def test_writer_reads_own_writes(self):
+        """После записи пользователь читает из основной базы"""
+        response = self.authorized_client.get(
+            reverse('profile_follow', kwargs={'username': 'author'}))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 60)
+        self.assertTrue(Follow.objects.filter(
+            author=self.author, user=self.reader).exists())
+        Post.objects.filter(text='Новый пост').update(text='Правка')
+        with override_settings(REPLICA_MAX_LAG=0):
+            response = self.authorized_client.get(
+                reverse('group', kwargs={'slug': 'group'}))
+            self.assertContains(response, 'Правка')
+            # Без cookie тот же запрос читает реплику
+            self.authorized_client.cookies.pop(PIN_COOKIE)
+            cache.clear()
+            response = self.authorized_client.get(
+                reverse('group', kwargs={'slug': 'group'}))
+            self.assertNotContains(response, 'Правка')
+
+    def test_writes_go_to_primary(self):
+        """Запись и чтение вне запроса идут в основную базу"""
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertIsNone(router.db_for_read(Post))
+        self.authorized_client.post(
+            reverse('new_post'), data={'text': 'Пост читателя'})
+        self.assertTrue(Post.objects.filter(text='Пост читателя').exists())
@@ -0,0 +1,96 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post, User
+from posts.stemmer import stem
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.cats = Post.objects.create(
+            text='Коты любят спать на солнце', author=cls.user)
+        cls.dogs = Post.objects.create(
+            text='Собаки охраняют дом', author=cls.user)
+        Comment.objects.create(
+            text='А мой кот спит весь день', post=cls.dogs, author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def found(self, query):
+        response = self.guest_client.get(reverse('search'), {'q': query})
+        return [post.text for post in response.context['page']]
+
+    def test_stemmer_reduces_word_forms(self):
+        """Формы слова приводятся к одной основе"""
+        self.assertEqual(stem('котов'), stem('Коты'))
+        self.assertEqual(stem('ёлки'), stem('елка'))
+
+    def test_search_finds_word_forms_ranked(self):
+        """Поиск находит другие формы слова, посты с совпадением
+        в тексте выше постов с совпадением в комментариях"""
+        self.assertEqual(self.found('кота'), [
+            'Коты любят спать на солнце', 'Собаки охраняют дом'])
+        self.assertEqual(self.found('собака охраняет'),
+                         ['Собаки охраняют дом'])
+        self.assertEqual(self.found('жирафы'), [])
+        self.assertEqual(self.found(''), [])
+
+    def test_index_follows_writes(self):
+        """Индекс обновляется при правке и удалении постов
+        и комментариев"""
+        self.cats.text = 'Попугаи любят спать'
+        self.cats.save()
+        self.assertEqual(self.found('попугай'), ['Попугаи любят спать'])
+        Comment.objects.filter(post=self.dogs).delete()
+        self.assertEqual(self.found('кот'), [])
+        self.cats.delete()
+        self.assertEqual(self.found('спать'), [])
+
+    def test_comments_are_indexed_incrementally(self):
+        """Комментарий меняет индекс поста, не перечитывая остальные
+        комментарии"""
+        with CaptureQueriesContext(connection) as queries:
+            first = Comment.objects.create(
+                text='Попугай поёт', post=self.cats, author=self.user)
+        self.assertFalse(any('"posts_comment"."text"' in query['sql']
+                             for query in queries))
+        second = Comment.objects.create(
+            text='Попугаи', post=self.cats, author=self.user)
+        first.delete()
+        self.assertEqual(self.found('попугай'),
+                         ['Коты любят спать на солнце'])
+        self.assertEqual(self.found('поёт'), [])
+        second.delete()
+        self.assertEqual(self.found('попугай'), [])
+        self.assertEqual(self.found('спать'), ['Коты любят спать на солнце'])
+        Post.objects.filter(pk=self.dogs.pk).delete()
+        self.assertEqual(self.found('кот'), ['Коты любят спать на солнце'])
+
+    def test_search_page_paginates(self):
+        """Страница поиска выводит карточки постов и делится на страницы"""
+        Post.objects.bulk_create(
+            Post(text=f'Кошка номер {i}', author=self.user)
+            for i in range(12))
+        call_command('rebuild_search_index', stdout=StringIO())
+        first = self.guest_client.get(reverse('search'), {'q': 'кошки'})
+        self.assertEqual(first.context['page'].paginator.count, 12)
+        self.assertContains(first, 'Кошка номер 11')
+        self.assertContains(
+            first, '?q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B8&amp;page=2')
+        second = self.guest_client.get(
+            reverse('search'), {'q': 'кошки', 'page': 2})
+        self.assertEqual(len(second.context['page']), 2)
+
+
+@override_settings(SEARCH_BACKEND='posts.search.InvertedIndexBackend')
+class InvertedIndexSearchTests(SearchTests):
+    pass
@@ -0,0 +1,70 @@
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from yatube.sqlite_cache import SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        options.setdefault('STATS_INTERVAL', 0)
+        return SQLiteCache(f'{self.directory}/cache.sqlite3',
+                           {'OPTIONS': options})
+
+    def test_values_are_shared_between_instances(self):
+        """Записи одного процесса видны другому"""
+        self.cache.set('key', {'value': 1})
+        self.cache.set_many({'a': 1, 'b': 2})
+        other = self.make_cache()
+        self.assertEqual(other.get('key'), {'value': 1})
+        self.assertEqual(other.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expired_values_are_missing(self):
+        """Просроченные записи не читаются и не мешают add()"""
+        self.cache.set('key', 'old', timeout=10)
+        with mock.patch('yatube.sqlite_cache.time.time',
+                        return_value=time.time() + 20):
+            self.assertIsNone(self.cache.get('key'))
+            self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'newer'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr_is_shared(self):
+        """incr() меняет общее значение, на пустом ключе — ValueError"""
+        self.cache.set('generation', 1, None)
+        self.make_cache().incr('generation')
+        self.assertEqual(self.cache.incr('generation', 10), 12)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_least_recently_used_are_evicted(self):
+        """При переполнении вытесняются давно не читавшиеся записи,
+        вытеснения попадают в метрики"""
+        cache = self.make_cache(MAX_ENTRIES=4, CULL_FREQUENCY=4,
+                                CULL_EVERY=1, ACCESS_RESOLUTION=0)
+        now = time.time()
+        for i in range(4):
+            with mock.patch('yatube.sqlite_cache.time.time',
+                            return_value=now + i):
+                cache.set(f'key{i}', i)
+        with mock.patch('yatube.sqlite_cache.time.time',
+                        return_value=now + 10):
+            cache.get('key0')
+            cache.set('key4', 4)
+        self.assertEqual(cache.get_many([f'key{i}' for i in range(5)]),
+                         {'key0': 0, 'key3': 3, 'key4': 4})
+        metrics = cache.metrics()
+        self.assertEqual(metrics['evictions'], 2)
+        self.assertEqual(metrics['entries'], 3)
+        self.assertEqual(metrics['hits'], 4)
+        self.assertEqual(metrics['misses'], 2)
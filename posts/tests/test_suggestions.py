@@ -0,0 +1,112 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Suggestion, User
+from posts.suggestions import FollowGraph, suggestions_for
+
+
+class FollowGraphTests(TestCase):
+    def test_friends_of_friends_rank_first(self):
+        """Кандидат, которого читают несколько подписок, выше"""
+        graph = FollowGraph([(1, 2), (1, 3), (2, 4), (3, 4), (2, 5)])
+        result = graph.suggest(1, 5, hub_limit=10)
+        self.assertEqual([candidate for candidate, _, _ in result], [4, 5])
+        self.assertEqual(result[0][2], 2)
+
+    def test_similar_readers(self):
+        """Читатели с похожими подписками подсказывают своих авторов"""
+        graph = FollowGraph([(1, 10), (1, 11), (2, 10), (2, 11), (2, 12),
+                             (3, 10), (3, 13)])
+        candidates = [c for c, _, _ in graph.suggest(1, 5, hub_limit=10)]
+        self.assertEqual(candidates, [12, 13])
+
+    def test_hubs_are_skipped_for_similar_readers(self):
+        graph = FollowGraph([(1, 10), (2, 10), (2, 12)])
+        self.assertEqual(graph.suggest(1, 5, hub_limit=1), [])
+
+    def test_popular_authors_fill_the_list(self):
+        """Новому пользователю советуют самых читаемых авторов"""
+        graph = FollowGraph([(2, 10), (3, 10), (2, 11), (1, 12)])
+        result = graph.suggest(4, 2, hub_limit=10, popular=graph.popular())
+        self.assertEqual(result, [(10, 0.0, 0), (11, 0.0, 0)])
+        candidates = [c for c, _, _ in graph.suggest(
+            1, 3, hub_limit=10, popular=graph.popular())]
+        self.assertNotIn(1, candidates)
+        self.assertNotIn(12, candidates)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0, SUGGESTIONS_COUNT=3)
+class SuggestionPagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.friend = User.objects.create_user(username='friend')
+        cls.authors = [User.objects.create_user(username=f'author{i}')
+                       for i in range(4)]
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+        for author in cls.authors:
+            Follow.objects.create(user=cls.friend, author=author)
+
+    def setUp(self):
+        cache.clear()
+        call_command('build_suggestions', stdout=StringIO())
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_lists_are_stored_per_user(self):
+        self.assertEqual(
+            Suggestion.objects.filter(user=self.reader).count(), 3)
+        self.assertFalse(Suggestion.objects.filter(
+            user=self.reader, candidate__in=[self.reader, self.friend],
+        ).exists())
+
+    def test_lookup_is_one_query_and_skips_new_follows(self):
+        """Список читается одним запросом, новые подписки из него
+        пропадают"""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        with self.assertNumQueries(1):
+            suggestions = suggestions_for(self.reader)
+            names = [item.candidate.username for item in suggestions]
+        self.assertEqual(len(names), 2)
+        self.assertNotIn('author0', names)
+
+    def test_suggestions_are_shown_on_own_pages(self):
+        """Рекомендации видны в своём профиле и в ленте подписок"""
+        own = reverse('profile', kwargs={'username': 'reader'})
+        other = reverse('profile', kwargs={'username': 'friend'})
+        for url in (own, reverse('follow_index')):
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(len(response.context['suggestions']), 3)
+                self.assertContains(response, 'Подписаться на всех')
+        response = self.authorized_client.get(other)
+        self.assertNotContains(response, 'Кого читать')
+
+    def test_follow_all_suggestions(self):
+        response = self.authorized_client.get(reverse('follow_index'))
+        names = [item.candidate.username
+                 for item in response.context['suggestions']]
+        self.authorized_client.post(reverse('follow_many'), {
+            'authors': names, 'next': reverse('follow_index')})
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 4)
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['suggestions']), 0)
+
+    def test_rebuild_changes_only_owner_validators(self):
+        """Пересчёт рекомендаций меняет ETag только своего профиля"""
+        own = reverse('profile', kwargs={'username': 'reader'})
+        guest_client = Client()
+        # Первый ответ ставит CSRF-cookie, которая входит в ETag
+        self.authorized_client.get(own)
+        owner_etag = self.authorized_client.get(own)['ETag']
+        guest_etag = guest_client.get(own)['ETag']
+        call_command('build_suggestions', stdout=StringIO())
+        response = self.authorized_client.get(
+            own, HTTP_IF_NONE_MATCH=owner_etag)
+        self.assertEqual(response.status_code, 200)
+        response = guest_client.get(own, HTTP_IF_NONE_MATCH=guest_etag)
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,66 @@
+import random
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+
+from posts.counters import actual_counters, drifted
+from posts.models import Comment, Follow, Group, Post, PostTag, User
+from posts.search import search_post_ids
+from posts.synthetic import power_law
+
+
+class GenerateDataTests(TestCase):
+    def generate(self, **options):
+        options = {'users': 20, 'groups': 3, 'posts': 60, 'comments': 90,
+                   'follows': 40, 'tags': 5, 'batch_size': 25, **options}
+        out = StringIO()
+        call_command('generate_data', stdout=out, **options)
+        return out.getvalue()
+
+    def test_rows_are_created(self):
+        """Команда создаёт заданное число строк и сообщает о ходе работы"""
+        output = self.generate()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 90)
+        self.assertTrue(0 < Follow.objects.count() <= 40)
+        self.assertFalse(Follow.objects.filter(
+            user=F('author')).exists())
+        self.assertIn('posts: 60/60 (100%)', output)
+
+    def test_derived_data_is_consistent(self):
+        """Счётчики, ссылки на теги и поиск соответствуют данным"""
+        self.generate()
+        for model, counters in actual_counters().items():
+            self.assertFalse(drifted(model, counters).exists())
+        link = PostTag.objects.select_related('post', 'tag').first()
+        self.assertIn(f'#{link.tag.name}', link.post.text)
+        self.assertEqual(link.pub_date, link.post.pub_date)
+        word = Post.objects.order_by('pk').first().text.split()[0]
+        self.assertTrue(search_post_ids(word, 10))
+
+    def test_same_seed_gives_same_data(self):
+        """Один seed даёт одинаковые тексты и распределение по авторам"""
+        def dataset(seed, prefix):
+            self.generate(seed=seed, prefix=prefix, tags=0)
+            users = User.objects.filter(username__startswith=prefix)
+            first = users.order_by('pk').first().pk
+            return [(text, author - first) for text, author in
+                    Post.objects.filter(author__in=users).order_by(
+                        'pk').values_list('text', 'author_id')]
+
+        first = dataset(7, 'first')
+        self.assertEqual(dataset(7, 'second'), first)
+        self.assertNotEqual(dataset(8, 'third'), first)
+
+    def test_power_law(self):
+        """Первые номера выпадают чаще, все номера в пределах"""
+        rng = random.Random(0)
+        picks = [power_law(rng, 100, 1.2) for _ in range(10000)]
+        self.assertTrue(all(0 <= pick < 100 for pick in picks))
+        self.assertGreater(picks.count(0), picks.count(50) * 10)
+        uniform = [power_law(rng, 10, 0) for _ in range(1000)]
+        self.assertEqual(set(uniform), set(range(10)))
@@ -0,0 +1,131 @@
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry, User
+from posts.timeline import rebalance_author
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки', author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def feed(self):
+        response = self.authorized_client.get(reverse('follow_index'))
+        return [post.text for post in response.context['page']]
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост попадает в материализованную ленту подписчика"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.feed(), ['Новый пост', 'Пост до подписки'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка переносит старые посты автора в ленту,
+        отписка их убирает"""
+        self.authorized_client.get(
+            reverse('profile_follow', kwargs={'username': 'author'}))
+        self.assertEqual(self.feed(), ['Пост до подписки'])
+        self.authorized_client.get(
+            reverse('profile_unfollow', kwargs={'username': 'author'}))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_pulled_on_read(self):
+        """Посты авторов с большим числом подписчиков не раскладываются
+        по лентам, а подмешиваются при чтении"""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=fan, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        star_post = Post.objects.create(text='Пост звезды', author=self.star)
+        Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(
+            post=star_post).exists())
+        self.assertEqual(
+            self.feed(), ['Новый пост', 'Пост звезды', 'Пост до подписки'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_crossing_the_limit_moves_author_between_sources(self):
+        """Автор, переставший быть крупным, раскладывается по лентам,
+        ставший крупным — убирается из них"""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=fan, author=self.star)
+        Post.objects.create(text='Пост звезды', author=self.star)
+        Follow.objects.filter(user=fan).delete()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, author=self.star).exists())
+        self.assertEqual(self.feed(), ['Пост звезды'])
+        Follow.objects.create(user=fan, author=self.star)
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.star).exists())
+        self.assertEqual(self.feed(), ['Пост звезды'])
+        fan.delete()
+        self.assertEqual(self.feed(), ['Пост звезды'])
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, author=self.star).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, TIMELINE_REBALANCE_ASYNC=True)
+    def test_rebalance_is_deferred(self):
+        """Подписка, после которой автор перестал быть крупным, не
+        перестраивает ленты сама: это делает фоновая задача"""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=fan, author=self.star)
+        Post.objects.create(text='Пост звезды', author=self.star)
+        Follow.objects.filter(user=fan).delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.star).exists())
+        rebalance_author(self.star.pk)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, author=self.star).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, POSTS_PER_PAGE=2)
+    def test_hybrid_feed_is_paged_by_cursor(self):
+        """Лента из двух частей листается курсором вперёд и назад
+        без COUNT(*) и без чтения предыдущих страниц"""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=fan, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        for number in range(3):
+            Post.objects.create(text=f'Звезда {number}', author=self.star)
+            Post.objects.create(text=f'Автор {number}', author=self.author)
+        url = reverse('follow_index')
+        texts, cursor, pages = [], None, []
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.authorized_client.get(
+                    url, {'cursor': cursor} if cursor else {})
+            self.assertFalse(any('COUNT(' in query['sql']
+                                 for query in queries.captured_queries))
+            page = response.context['feed_page']
+            pages.append([post.text for post in page])
+            texts += pages[-1]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+            self.assertContains(response, f'cursor={cursor}')
+        self.assertEqual(texts, [
+            'Автор 2', 'Звезда 2', 'Автор 1', 'Звезда 1', 'Автор 0',
+            'Звезда 0', 'Пост до подписки'])
+        response = self.authorized_client.get(
+            url, {'cursor': page.previous_cursor})
+        self.assertEqual([post.text for post in response.context['page']],
+                         pages[-2])
@@ -1,4 +1,8 @@
-from django.test import Client, TestCase
+import re
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django import forms
 from django.core.cache import cache
@@ -176,10 +180,9 @@ class TaskPagesTests(TestCase):
         """Кэширование на главной странице работает"""
         response = self.authorized_client.get(reverse('index'))
         first_response = response.content
-        Post.objects.create(
-            text='Пост для проверки кэширования',
-            author=self.user,
-        )
+        # изменение в обход сигналов не сбрасывает кэш
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Пост для проверки кэширования')
         response = self.authorized_client.get(reverse('index'))
         second_response = response.content
         self.assertEqual(first_response, second_response)
@@ -188,6 +191,49 @@ class TaskPagesTests(TestCase):
         second_response = response.content
         self.assertNotEqual(first_response, second_response)
 
+    def test_cache_is_invalidated_by_changes(self):
+        """Новый пост, комментарий и правка группы сразу видны
+        на закэшированных страницах"""
+        urls = {
+            'index': reverse('index'),
+            'group': reverse('group', kwargs={'slug': 'testgroup'}),
+            'profile': reverse('profile', kwargs={'username': 'testuser'}),
+        }
+        for url in urls.values():
+            self.authorized_client.get(url)
+        Post.objects.create(
+            text='Пост для проверки кэширования',
+            author=self.user,
+            group=self.group,
+        )
+        for name, url in urls.items():
+            with self.subTest(page=name):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Пост для проверки кэширования')
+        post_url = reverse(
+            'post', kwargs={'username': 'testuser', 'post_id': 100})
+        self.authorized_client.get(post_url)
+        Comment.objects.create(
+            text='Новый комментарий', post=self.post, author=self.user2)
+        self.assertContains(
+            self.authorized_client.get(post_url), 'Новый комментарий')
+        self.group.title = 'Новое название группы'
+        self.group.save()
+        self.assertContains(self.authorized_client.get(urls['index']),
+                            'Новое название группы')
+
+    def test_cache_depends_on_page(self):
+        """Разные страницы ленты не делят один фрагмент кэша"""
+        for i in range(12):
+            Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=self.user2,
+            )
+        first = self.authorized_client.get(reverse('index'))
+        second = self.authorized_client.get(reverse('index'), {'page': 2})
+        self.assertNotContains(second, 'Тестовый текст 11')
+        self.assertContains(first, 'Тестовый текст 11')
+
     def test_subscription_follow(self):
         """Авторизованный пользователь может подписываться
         на других пользователей"""
@@ -242,3 +288,141 @@ class TaskPagesTests(TestCase):
             context['comments'][0].text, 'Текст комментария')
 
     # тесты для комментариев см в test_forms, спасибо за работу!
+
+
+# Бюджет считается для отрисовки страницы, а не для кэша целых страниц
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class FeedQueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testgroup',
+            description='Тестовое описание группы'
+        )
+        for i in range(30):
+            author = User.objects.create_user(username=f'author{i}')
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=author,
+                group=cls.group,
+            )
+            Comment.objects.create(
+                text='Текст комментария', post=post, author=cls.user)
+            Comment.objects.create(
+                text='Текст комментария', post=post, author=author)
+            Post.objects.create(
+                text=f'Тестовый текст автора {i}',
+                author=cls.user,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feed_query_budget_does_not_depend_on_page_size(self):
+        """Число запросов ленты не зависит от числа постов на странице"""
+        # Гость: пост-лента и варианты картинок двумя запросами,
+        # группа/профиль — плюс объект страницы (у профиля вместе
+        # со счётчиками user_info.html) и ключ объекта для ETag.
+        budgets = {
+            reverse('index'): 2,
+            reverse('group', kwargs={'slug': 'testgroup'}): 4,
+            reverse('profile', kwargs={'username': 'testuser'}): 4,
+        }
+        for per_page in (5, 10, 20):
+            for url, budget in budgets.items():
+                with self.subTest(url=url, per_page=per_page):
+                    with self.settings(POSTS_PER_PAGE=per_page):
+                        with self.assertNumQueries(budget):
+                            response = self.guest_client.get(url)
+                    self.assertEqual(
+                        len(response.context['page']), per_page)
+
+    def test_follow_feed_query_budget(self):
+        """Лента подписок укладывается в фиксированное число запросов"""
+        for per_page in (5, 10, 20):
+            with self.subTest(per_page=per_page):
+                with self.settings(POSTS_PER_PAGE=per_page):
+                    # сессия, пользователь, крупные авторы из подписок,
+                    # сама страница, варианты картинок
+                    # и рекомендации «кого читать»
+                    with self.assertNumQueries(6):
+                        response = self.authorized_client.get(
+                            reverse('follow_index'))
+                self.assertEqual(len(response.context['page']), per_page)
+                self.assertContains(response, 'Комментариев: 2')
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0, COMMENTS_PER_PAGE=10)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+        for i in range(25):
+            author = User.objects.create_user(username=f'author{i}')
+            Comment.objects.create(
+                text=f'Комментарий {i}', post=cls.post, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.kwargs = {'username': 'testuser', 'post_id': self.post.pk}
+
+    def test_post_page_shows_first_comments(self):
+        """На странице поста только первые комментарии и ссылка
+        на следующие"""
+        response = self.guest_client.get(reverse('post', kwargs=self.kwargs))
+        texts = [comment.text for comment in response.context['comments']]
+        self.assertEqual(texts, [f'Комментарий {i}'
+                                 for i in range(24, 14, -1)])
+        cursor = response.context['comment_page'].next_cursor
+        self.assertContains(response, f'comments={cursor}')
+        response = self.guest_client.get(
+            reverse('post', kwargs=self.kwargs), {'comments': cursor})
+        self.assertEqual(response.context['comments'][0].text,
+                         'Комментарий 14')
+
+    def test_fragment_endpoint_walks_all_comments(self):
+        """JSON-фрагменты по курсору отдают все комментарии по разу"""
+        url = reverse('post_comments', kwargs=self.kwargs)
+        seen, cursor = [], ''
+        while cursor is not None:
+            data = self.guest_client.get(url, {'cursor': cursor}).json()
+            seen.extend(re.findall(r'Комментарий (\d+)', data['html']))
+            cursor = data['next']
+        self.assertEqual(seen, [str(i) for i in range(24, -1, -1)])
+
+    def test_fragment_endpoint_unknown_post(self):
+        response = self.guest_client.get(reverse(
+            'post_comments', kwargs={'username': 'author0',
+                                     'post_id': self.post.pk}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_comment_query_budget_does_not_depend_on_page_size(self):
+        """Авторы комментариев читаются одним запросом со страницей"""
+        url = reverse('post_comments', kwargs=self.kwargs)
+        for per_page in (5, 10, 20):
+            with self.subTest(per_page=per_page):
+                cache.clear()
+                with self.settings(COMMENTS_PER_PAGE=per_page):
+                    # ключ поста для ETag, пост, страница, EXISTS
+                    with self.assertNumQueries(4):
+                        self.guest_client.get(url)
+
+    def test_cached_comments_skip_database(self):
+        """Закэшированный фрагмент комментариев не читает их из базы"""
+        url = reverse('post', kwargs=self.kwargs)
+        self.guest_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url)
+        self.assertFalse([query for query in queries
+                          if 'posts_comment' in query['sql']])
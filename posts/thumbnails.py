@@ -0,0 +1,70 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Миниатюра и варианты для srcset (posts.renditions) считаются в пуле
+потоков сразу после сохранения поста, а шаблон читает готовый путь из
+Post.image_thumbnail и до окончания работы показывает заглушку.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import get_thumbnail
+
+from posts import cache, renditions
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def generate(post_id):
+    """Посчитать миниатюру поста и сохранить её путь."""
+    post = Post.objects.filter(pk=post_id).only(
+        'image', 'author', 'group').first()
+    if post is None or not post.image:
+        return None
+    thumbnail = get_thumbnail(post.image, settings.POST_THUMBNAIL_GEOMETRY,
+                              **settings.POST_THUMBNAIL_OPTIONS)
+    try:
+        renditions.generate(post)
+    except Exception:
+        # без вариантов для srcset карточка обойдётся одной миниатюрой
+        logger.exception('Не удалось подготовить варианты картинки поста %s',
+                         post_id)
+    # Картинку могли заменить, пока считалась миниатюра старой.
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        image_thumbnail=thumbnail.name)
+    if updated:
+        cache.bump_post(post_id, post.author_id, post.group_id)
+    return thumbnail.name
+
+
+def _run(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюру поста %s', post_id)
+    finally:
+        connection.close()
+
+
+def schedule(post):
+    """Поставить подготовку миниатюры в очередь после коммита."""
+    if not post.image:
+        return
+    if not settings.THUMBNAIL_ASYNC:
+        generate(post.pk)
+        return
+    transaction.on_commit(lambda: get_executor().submit(_run, post.pk))
@@ -0,0 +1,257 @@
+"""Ленты подписок, материализованные при записи.
+
+Новый пост раскладывается в TimelineEntry всех подписчиков автора.
+Авторы, у которых больше ``TIMELINE_FANOUT_LIMIT`` подписчиков, не
+раскладываются: их посты подмешиваются в ленту при чтении. Когда
+число подписчиков автора пересекает порог, его посты переносятся в
+ленты подписчиков или убираются из них (``rebalance``).
+"""
+import functools
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+
+from posts.models import Follow, Post, ProfileStats, TimelineEntry
+
+TIMELINE_ORDERING = ('-feed_date', '-id')
+# Сколько пар (пользователь, автор) проверять одним запросом
+PAIRS_PER_QUERY = 500
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1,
+                                       thread_name_prefix='timelines')
+    return _executor
+
+
+def is_fanout_author(author_id):
+    return not ProfileStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def fan_out(post):
+    """Добавить пост в ленты подписчиков автора."""
+    if not is_fanout_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id, user__isnull=False,
+    ).values_list('user_id', flat=True)
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=user_id, post_id=post.pk,
+                           author_id=post.author_id, pub_date=post.pub_date)
+             for user_id in followers.iterator()),
+            batch_size=settings.TIMELINE_BATCH_SIZE, ignore_conflicts=True,
+        )
+
+
+def backfill(user_id, author_id):
+    """Перенести последние посты автора в ленту нового подписчика."""
+    if not is_fanout_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list('pk', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, author_id=author_id,
+                       pub_date=pub_date)
+         for pk, pub_date in posts[:settings.TIMELINE_BACKFILL_LIMIT]),
+        batch_size=settings.TIMELINE_BATCH_SIZE, ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убрать посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def materialize(author_id):
+    """Разложить последние посты автора по лентам всех подписчиков.
+
+    Подписчики читаются пачками по ключу, пачка пишется своей
+    транзакцией.
+    """
+    posts = list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list(
+        'pk', 'pub_date')[:settings.TIMELINE_BACKFILL_LIMIT])
+    if not posts:
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id, user__isnull=False,
+    ).order_by('pk').values_list('pk', 'user_id')
+    batch_size = settings.TIMELINE_BATCH_SIZE
+    batch = list(followers[:batch_size])
+    while batch:
+        with transaction.atomic():
+            TimelineEntry.objects.bulk_create(
+                (TimelineEntry(user_id=user_id, post_id=pk,
+                               author_id=author_id, pub_date=pub_date)
+                 for _, user_id in batch for pk, pub_date in posts),
+                batch_size=batch_size, ignore_conflicts=True,
+            )
+        batch = list(followers.filter(pk__gt=batch[-1][0])[:batch_size])
+
+
+def rebalance_author(author_id):
+    """Привести ленты к текущему числу подписчиков автора: крупного
+    автора убрать из материализованных лент, обычного — разложить."""
+    count = ProfileStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first()
+    if count is None:
+        return
+    if count > settings.TIMELINE_FANOUT_LIMIT:
+        TimelineEntry.objects.filter(author_id=author_id).delete()
+    else:
+        materialize(author_id)
+
+
+def _run_rebalance(author_id):
+    try:
+        rebalance_author(author_id)
+    except Exception:
+        logger.exception('Не удалось перестроить ленты автора %s', author_id)
+    finally:
+        connection.close()
+
+
+def rebalance(deltas):
+    """Учесть пересечение ``TIMELINE_FANOUT_LIMIT`` после изменения
+    числа подписчиков авторов на ``deltas`` ({author_id: delta}).
+
+    Автор, ставший крупным, убирается из материализованных лент (его
+    посты теперь подмешиваются при чтении), а переставший им быть —
+    раскладывается заново: иначе посты, опубликованные за время
+    чтения при запросе, пропали бы из лент. Перестройка затрагивает
+    до ``TIMELINE_FANOUT_LIMIT`` лент, поэтому при
+    ``TIMELINE_REBALANCE_ASYNC`` она идёт в фоне после коммита и
+    сверяется с числом подписчиков на тот момент.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    for author_id, count in ProfileStats.objects.filter(
+            user_id__in=[author for author, delta in deltas.items() if delta],
+    ).values_list('user_id', 'followers_count'):
+        before = count - deltas[author_id]
+        if (before > limit) == (count > limit):
+            continue
+        if not settings.TIMELINE_REBALANCE_ASYNC:
+            rebalance_author(author_id)
+        else:
+            transaction.on_commit(functools.partial(
+                get_executor().submit, _run_rebalance, author_id))
+
+
+def pairs_filters(pairs, user='user_id', author='author_id'):
+    """Условия «пара (пользователь, автор) из ``pairs``» по частям.
+
+    В условии по слагаемому OR на пользователя, а SQLite не разбирает
+    выражения глубже 1000 уровней, поэтому в одну часть попадает не
+    больше ``PAIRS_PER_QUERY`` пар.
+    """
+    authors = defaultdict(list)
+    for user_id, author_id in pairs:
+        authors[user_id].append(author_id)
+    condition, size = Q(pk__in=[]), 0
+    for user_id, ids in authors.items():
+        for start in range(0, len(ids), PAIRS_PER_QUERY):
+            part = ids[start:start + PAIRS_PER_QUERY]
+            if size + len(part) > PAIRS_PER_QUERY:
+                yield condition
+                condition, size = Q(pk__in=[]), 0
+            condition |= Q(**{user: user_id, f'{author}__in': part})
+            size += len(part)
+    if size:
+        yield condition
+
+
+def backfill_many(pairs):
+    """``backfill`` для многих подписок (пользователь, автор) сразу.
+
+    Последние посты всех авторов читаются одним запросом и
+    раскладываются подписчикам одним ``bulk_create``.
+    """
+    authors = {author_id for _, author_id in pairs}
+    authors -= set(ProfileStats.objects.filter(
+        user_id__in=authors,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True))
+    if not authors:
+        return
+    latest = Post.objects.filter(
+        author_id=OuterRef('author_id'),
+    ).order_by('-pub_date', '-id').values('pk')
+    posts = defaultdict(list)
+    for pk, author_id, pub_date in Post.objects.filter(
+            author_id__in=authors,
+            pk__in=Subquery(latest[:settings.TIMELINE_BACKFILL_LIMIT]),
+    ).values_list('pk', 'author_id', 'pub_date'):
+        posts[author_id].append((pk, pub_date))
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, author_id=author_id,
+                       pub_date=pub_date)
+         for user_id, author_id in pairs
+         for pk, pub_date in posts.get(author_id, ())),
+        batch_size=settings.TIMELINE_BATCH_SIZE, ignore_conflicts=True,
+    )
+
+
+def prune_many(pairs):
+    """``prune`` для многих отписок: DELETE на ``PAIRS_PER_QUERY`` пар."""
+    for condition in pairs_filters(pairs):
+        TimelineEntry.objects.filter(condition).delete()
+
+
+def timeline_sources(user):
+    """Части ленты подписок: материализованная и, если нужно, посты
+    крупных авторов, которые подмешиваются при чтении.
+
+    У постов есть аннотация ``feed_date`` — дата в порядке ленты
+    (``TIMELINE_ORDERING``), по ней части можно листать курсором.
+    """
+    materialized = Post.objects.feed().filter(
+        timeline_entries__user=user,
+    ).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+    ).order_by(*TIMELINE_ORDERING)
+    pulled_authors = list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True))
+    if not pulled_authors:
+        return [materialized]
+    return [
+        materialized.exclude(author__in=pulled_authors),
+        Post.objects.feed().filter(author__in=pulled_authors).annotate(
+            feed_date=F('pub_date')).order_by(*TIMELINE_ORDERING),
+    ]
+
+
+def rebuild(batch_size=500):
+    """Пересобрать все материализованные ленты из подписок.
+
+    Подписки читаются пачками по ключу, пачка переносится одной
+    транзакцией, как в posts.search.rebuild.
+    """
+    TimelineEntry.objects.all().delete()
+    follows = Follow.objects.filter(
+        user__isnull=False, author__isnull=False,
+    ).order_by('pk').values_list('pk', 'user_id', 'author_id')
+    total = 0
+    batch = list(follows[:batch_size])
+    while batch:
+        with transaction.atomic():
+            for _, user_id, author_id in batch:
+                backfill(user_id, author_id)
+        total += len(batch)
+        batch = list(follows.filter(pk__gt=batch[-1][0])[:batch_size])
+    return total
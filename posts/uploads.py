@@ -0,0 +1,257 @@
+"""Потоковый приём картинок постов.
+
+Загрузка пишется кусками во временный файл рядом с MEDIA_ROOT/posts/,
+поэтому сохранение в хранилище сводится к переименованию, а память
+воркера не зависит от размера файла. По мере поступления данных
+проверяются сигнатура формата, размер файла и число пикселей по
+заголовку картинки, без декодирования, так что «бомбы» с огромным
+разрешением отклоняются по первым байтам. Метаданные (EXIF, XMP, текстовые
+чанки PNG) вырезаются потоково, по сегментам файла.
+
+Обработчик ставится не на весь сайт, а на view с формой поста
+декоратором ``image_uploads``.
+"""
+import functools
+import os
+import shutil
+import struct
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import (SkipFile,
+                                             TemporaryFileUploadHandler)
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+SIGNATURES = {
+    b'\xff\xd8\xff': 'jpeg',
+    b'\x89PNG\r\n\x1a\n': 'png',
+    b'GIF87a': 'gif',
+    b'GIF89a': 'gif',
+}
+# Сколько начальных байт копить в поисках размеров картинки.
+HEADER_LIMIT = 256 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Сегменты JPEG с метаданными: APP1 (EXIF, XMP), APP13 (IPTC), COM.
+JPEG_METADATA_MARKERS = {0xE1, 0xED, 0xFE}
+JPEG_STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+JPEG_SOS, JPEG_EOI = 0xDA, 0xD9
+PNG_METADATA_CHUNKS = {b'eXIf', b'tEXt', b'iTXt', b'zTXt', b'tIME'}
+
+
+def upload_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'posts', 'uploads')
+
+
+class MediaTemporaryUploadedFile(TemporaryUploadedFile):
+    """Временный файл загрузки в каталоге MEDIA_ROOT/posts/uploads."""
+
+    def __init__(self, name, content_type, size, charset,
+                 content_type_extra=None):
+        os.makedirs(upload_dir(), exist_ok=True)
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix='.upload' + ext,
+                                           dir=upload_dir())
+        UploadedFile.__init__(self, file, name, content_type, size, charset,
+                              content_type_extra)
+
+
+def detect_format(header):
+    for signature, fmt in SIGNATURES.items():
+        if header.startswith(signature):
+            return fmt
+    return None
+
+
+def png_size(header):
+    if len(header) < 24 or header[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', header[16:24])
+
+
+def gif_size(header):
+    if len(header) < 10:
+        return None
+    return struct.unpack('<HH', header[6:10])
+
+
+def jpeg_size(header):
+    offset = 2
+    while offset + 9 <= len(header):
+        if header[offset] != 0xFF:
+            raise ValueError('Повреждённая структура JPEG')
+        code = header[offset + 1]
+        if code == 0xFF:
+            offset += 1
+            continue
+        if code in JPEG_STANDALONE_MARKERS:
+            offset += 2
+            continue
+        if code in JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>HH',
+                                          header[offset + 5:offset + 9])
+            return width, height
+        (length,) = struct.unpack('>H', header[offset + 2:offset + 4])
+        offset += 2 + length
+    return None
+
+
+SIZE_READERS = {'jpeg': jpeg_size, 'png': png_size, 'gif': gif_size}
+
+
+def copy_bytes(src, dst, length):
+    while length > 0:
+        chunk = src.read(min(CHUNK_SIZE, length))
+        if not chunk:
+            raise ValueError('Файл обрывается посреди сегмента')
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def strip_jpeg(src, dst):
+    dst.write(src.read(2))
+    while True:
+        marker = src.read(2)
+        while marker[1:] == b'\xff':
+            marker = b'\xff' + src.read(1)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError('Повреждённая структура JPEG')
+        code = marker[1]
+        if code in JPEG_STANDALONE_MARKERS:
+            dst.write(marker)
+            continue
+        if code in (JPEG_SOS, JPEG_EOI):
+            dst.write(marker)
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            return
+        length_bytes = src.read(2)
+        (length,) = struct.unpack('>H', length_bytes)
+        if code in JPEG_METADATA_MARKERS:
+            src.seek(length - 2, os.SEEK_CUR)
+            continue
+        dst.write(marker + length_bytes)
+        copy_bytes(src, dst, length - 2)
+
+
+def strip_png(src, dst):
+    dst.write(src.read(8))
+    while True:
+        head = src.read(8)
+        if not head:
+            return
+        (length,) = struct.unpack('>I', head[:4])
+        if head[4:] in PNG_METADATA_CHUNKS:
+            src.seek(length + 4, os.SEEK_CUR)
+            continue
+        dst.write(head)
+        copy_bytes(src, dst, length + 4)
+
+
+STRIPPERS = {'jpeg': strip_jpeg, 'png': strip_png}
+
+
+class CappedImageUploadHandler(TemporaryFileUploadHandler):
+    """Обработчик загрузок с ограничениями для картинок постов.
+
+    Файл, нарушивший ограничение, пропускается (SkipFile), а причина
+    кладётся в ``request.upload_errors[имя поля]`` для формы.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super(TemporaryFileUploadHandler, self).new_file(
+            field_name, *args, **kwargs)
+        self.file = MediaTemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra)
+        self.header = b''
+        self.format = None
+        self.size_checked = False
+        self.received = 0
+
+    def record_error(self, message):
+        if self.request is not None:
+            if not hasattr(self.request, 'upload_errors'):
+                self.request.upload_errors = {}
+            self.request.upload_errors[self.field_name] = message
+
+    def reject(self, message):
+        self.record_error(message)
+        self.file.close()
+        raise SkipFile(message)
+
+    def check_header(self, raw_data):
+        self.header += raw_data[:HEADER_LIMIT - len(self.header)]
+        if self.format is None:
+            self.format = detect_format(self.header)
+            if self.format is None and len(self.header) >= 8:
+                self.reject('Загрузите картинку в формате JPEG, PNG или GIF.')
+            if self.format is None:
+                return
+        try:
+            size = SIZE_READERS[self.format](self.header)
+        except ValueError:
+            self.reject('Повреждённый файл картинки.')
+        if size is None:
+            if len(self.header) >= HEADER_LIMIT:
+                self.reject('Не удалось прочитать размеры картинки.')
+            return
+        width, height = size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            self.reject('Слишком большое разрешение картинки.')
+        self.size_checked = True
+        self.header = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.reject('Размер файла больше {}.'.format(
+                filesizeformat(settings.POST_IMAGE_MAX_UPLOAD_SIZE)))
+        if not self.size_checked:
+            self.check_header(raw_data)
+        self.file.write(raw_data)
+
+    def discard(self, message):
+        # SkipFile из file_complete парсер не перехватывает: файл просто
+        # не попадает в request.FILES, а форма покажет ошибку.
+        self.record_error(message)
+        self.file.close()
+
+    def file_complete(self, file_size):
+        if not self.size_checked:
+            return self.discard('Не удалось прочитать размеры картинки.')
+        strip = STRIPPERS.get(self.format)
+        if strip is None:
+            return super().file_complete(file_size)
+        stripped = MediaTemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra)
+        self.file.seek(0)
+        try:
+            strip(self.file, stripped)
+        except (ValueError, struct.error):
+            stripped.close()
+            return self.discard('Повреждённый файл картинки.')
+        self.file.close()
+        self.file = stripped
+        stripped.size = stripped.tell()
+        stripped.seek(0)
+        return stripped
+
+
+def image_uploads(view):
+    """Принимать файлы запроса обработчиком картинок постов.
+
+    Обработчики нужно заменить до чтения тела запроса, а его читает
+    проверка CSRF в middleware, поэтому она переносится внутрь.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [CappedImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
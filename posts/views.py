@@ -1,62 +1,151 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404, HttpResponse, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.http import is_safe_url
+from django.views.decorators.http import require_safe
 
-from posts.models import Post, Group, User, Follow
+from posts import follows
+from posts.cache import (FEED_SCOPE, SUGGESTIONS_SCOPE, fragment_version,
+                         group_scope, post_scope, profile_scope, stats_scope,
+                         viewer_key)
+from posts.comments import comment_page, reply_parent, thread_root
+from posts.conditional import conditional_page
+from posts.hashtags import TAG_FEED_ORDERING, tag_feed
+from posts.metrics import registry
+from posts.models import Post, Group, Tag, User, Follow
 from posts.forms import PostForm, CommentForm
+from posts.paginator import MergedCursorPaginator, paginate
+from posts.replicas import replica_reads
+from posts.search import SearchResults
+from posts.suggestions import suggestions_for
+from posts.thumbnails import schedule as schedule_thumbnail
+from posts.timeline import TIMELINE_ORDERING, timeline_sources
+from posts.uploads import image_uploads
 
 
+def index_scopes():
+    return [FEED_SCOPE]
+
+
+def group_scopes(slug):
+    pk = Group.objects.filter(slug=slug).values_list("pk", flat=True).first()
+    return [group_scope(pk)] if pk else None
+
+
+def profile_scopes(username):
+    pk = User.objects.filter(username=username).values_list(
+        "pk", flat=True).first()
+    if not pk:
+        return None
+    return [profile_scope(pk), stats_scope(pk)]
+
+
+def own_profile_scopes(user, username):
+    # Рекомендации видны только в своём профиле
+    return [SUGGESTIONS_SCOPE] if user.username == username else []
+
+
+def post_scopes(username, post_id):
+    author_id = Post.objects.filter(
+        pk=post_id, author__username=username).values_list(
+        "author_id", flat=True).order_by().first()
+    if author_id is None:
+        return None
+    return [post_scope(post_id), profile_scope(author_id),
+            stats_scope(author_id)]
+
+
+@replica_reads
+@conditional_page(index_scopes)
 def index(request):
-    latest = Post.objects.all()
-    paginator = Paginator(latest, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    return render(request, "index.html", {"page": page})
+    page = paginate(request, Post.objects.feed())
+    return render(request, "index.html", {
+        "page": page, "cache_version": fragment_version(FEED_SCOPE),
+        "viewer_key": viewer_key(request.user, page)})
 
 
+@replica_reads
+@conditional_page(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    return render(request, "group.html", {"group": group, "page": page})
+    page = paginate(request, group.posts.feed())
+    return render(request, "group.html", {
+        "group": group, "page": page,
+        "cache_version": fragment_version(group_scope(group.pk)),
+        "viewer_key": viewer_key(request.user, page)})
+
+
+@replica_reads
+def tag_posts(request, name):
+    tag = get_object_or_404(Tag, name=name.lower())
+    page = paginate(request, tag_feed(tag), ordering=TAG_FEED_ORDERING)
+    return render(request, "tag.html", {"tag": tag, "page": page})
+
+
+@replica_reads
+def search(request):
+    query = request.GET.get("q", "").strip()
+    paginator = Paginator(SearchResults(query), settings.POSTS_PER_PAGE)
+    page = paginator.get_page(request.GET.get("page"))
+    return render(request, "search.html", {"query": query, "page": page})
 
 
 @login_required
+@image_uploads
 def new_post(request):
     if request.method != "POST":
         form = PostForm()
         return render(request, "new.html", {"form": form})
-    form = PostForm(request.POST)
+    form = PostForm(request.POST, files=request.FILES or None,
+                    upload_errors=getattr(request, "upload_errors", None))
     if not form.is_valid():
         return render(request, "new.html", {"form": form})
     post = form.save(commit=False)
     post.author = request.user
-    post.save()
+    with transaction.atomic():
+        post.save()
+    schedule_thumbnail(post)
     return redirect("index")
 
 
+@replica_reads
+@conditional_page(profile_scopes, own_profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
     if not request.user.is_authenticated:
         following = False
     else:
         following = Follow.objects.filter(
             author=author, user=request.user).exists()
-    posts = author.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    page = paginate(request, author.posts.feed())
+    # Рекомендации видны только в своём профиле
+    suggestions = suggestions_for(author) if request.user == author else []
     return render(request, "profile.html", {
                   "author": author, "page": page,
-                  "following": following})
+                  "following": following, "suggestions": suggestions,
+                  "cache_version": fragment_version(profile_scope(author.pk)),
+                  "viewer_key": viewer_key(request.user, page)})
+
+
+def comment_context(request, post):
+    root = thread_root(post, request.GET.get("thread"))
+    page = comment_page(post, request.GET.get("comments"), root)
+    return {"comments": page.object_list, "comment_page": page,
+            "comment_cursor": request.GET.get("comments", ""),
+            "reply_to": request.GET.get("reply", "")}
 
 
+@replica_reads
+@conditional_page(post_scopes)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
+    post = get_object_or_404(Post.objects.feed().select_related(
+        'author__stats'), pk=post_id, author__username=username)
     author = post.author
-    comments = post.comments.all()
     if not request.user.is_authenticated:
         following = False
     else:
@@ -67,15 +156,34 @@ def post_view(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        form.save()
+        comment.parent = reply_parent(post, request.POST.get("parent"))
+        with transaction.atomic():
+            form.save()
         return redirect("add_comment", username, post_id)
     context = {"form": form, "post": post, "author": author,
-               "comments": comments, "is_comment": True,
-               "following": following}
+               **comment_context(request, post),
+               "is_comment": True,
+               "following": following,
+               "cache_version": fragment_version(post_scope(post.pk)),
+               "viewer_key": viewer_key(request.user, [post])}
     return render(request, "post.html", context)
 
 
+@require_safe
+@replica_reads
+@conditional_page(post_scopes)
+def post_comments(request, username, post_id):
+    post = get_object_or_404(Post, pk=post_id, author__username=username)
+    root = thread_root(post, request.GET.get("thread"))
+    page = comment_page(post, request.GET.get("cursor"), root)
+    html = render_to_string("include/comment_list.html", {
+        "post": post, "comments": page.object_list, "comment_page": page},
+        request)
+    return JsonResponse({"html": html, "next": page.next_cursor})
+
+
 @login_required
+@image_uploads
 def post_edit(request, username, post_id):
     post = get_object_or_404(Post, pk=post_id, author__username=username)
     author = post.author
@@ -83,20 +191,26 @@ def post_edit(request, username, post_id):
         return redirect("post",
                         username=author.username, post_id=post_id)
     form = PostForm(request.POST or None,
-                    files=request.FILES or None, instance=post)
+                    files=request.FILES or None, instance=post,
+                    upload_errors=getattr(request, "upload_errors", None))
     if not form.is_valid():
         context = {"author": author, "post": post,
                    "form": form, "is_edit": True}
         return render(request, "new.html", context)
+    image_changed = "image" in form.changed_data
+    if image_changed:
+        post.image_thumbnail = ""
     post.save()
+    if image_changed:
+        schedule_thumbnail(post)
     return redirect("post", username=request.user.username, post_id=post_id)
 
 
 @login_required
 def add_comment(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post = get_object_or_404(Post.objects.feed().select_related(
+        'author__stats'), author__username=username, id=post_id)
     author = post.author
-    comments = post.comments.all()
     following = Follow.objects.filter(
         author=author, user=request.user).exists()
     form = CommentForm(request.POST or None)
@@ -104,22 +218,33 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        form.save()
+        comment.parent = reply_parent(post, request.POST.get("parent"))
+        with transaction.atomic():
+            form.save()
         return redirect("add_comment", username, post_id)
     context = {"form": form, "post": post, "author": author,
-               "comments": comments, "is_comment": True,
-               "following": following}
+               **comment_context(request, post),
+               "is_comment": True,
+               "following": following,
+               "cache_version": fragment_version(post_scope(post.pk)),
+               "viewer_key": viewer_key(request.user, [post])}
     return render(request, "post.html", context)
 
 
 @login_required
+@replica_reads
 def follow_index(request):
-    latest = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(latest, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    return render(
-        request, "follow.html", {"page": page, "paginator": paginator})
+    feed_page = paginate(request, timeline_sources(request.user),
+                         paginator_class=MergedCursorPaginator,
+                         ordering=TIMELINE_ORDERING)
+    # page и paginator остаются в контексте в прежнем виде: это обычные
+    # Page и Paginator поверх уже прочитанных постов, запросов они не
+    # делают. Ссылки на соседние страницы строятся по курсорам feed_page
+    paginator = Paginator(feed_page.object_list, settings.POSTS_PER_PAGE)
+    return render(request, "follow.html", {
+        "page": paginator.page(1), "paginator": paginator,
+        "feed_page": feed_page,
+        "suggestions": suggestions_for(request.user)})
 
 
 @login_required
@@ -137,6 +262,31 @@ def profile_unfollow(request, username):
     return redirect('profile', username)
 
 
+@login_required
+def follow_many(request):
+    if request.method == "POST":
+        usernames = request.POST.getlist("authors")
+        usernames = usernames[:settings.FOLLOW_BATCH_LIMIT]
+        if request.POST.get("action") == "unfollow":
+            follows.unfollow(request.user, usernames)
+        else:
+            follows.follow(request.user, usernames)
+    next_url = request.POST.get("next")
+    if next_url and is_safe_url(next_url, {request.get_host()},
+                                request.is_secure()):
+        return redirect(next_url)
+    return redirect("follow_index")
+
+
+def metrics(request):
+    allowed = (request.user.is_staff
+               or request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS)
+    if not allowed:
+        raise Http404
+    return HttpResponse(registry.exposition(),
+                        content_type="text/plain; version=0.0.4")
+
+
 def page_not_found(request, exception):
     return render(request, "misc/404.html",
                   {"path": request.path}, status=404)
@@ -0,0 +1,4 @@
+"""SQLite с настройками для нескольких одновременных воркеров.
+
+Подключается в ``DATABASES`` как ``'ENGINE': 'yatube.db'``, см. base.py.
+"""
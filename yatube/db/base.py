@@ -0,0 +1,38 @@
+"""Бэкенд SQLite для конкурентной работы.
+
+Отличия от django.db.backends.sqlite3:
+
+* при открытии соединения выполняются PRAGMA из ``OPTIONS['pragmas']``
+  (по умолчанию ``DEFAULT_PRAGMAS``): журнал WAL, в котором читатели не
+  ждут писателя, synchronous=NORMAL и кэш страниц в памяти;
+* транзакции начинаются с ``BEGIN IMMEDIATE``. Обычный ``BEGIN``
+  откладывает блокировку до первой записи, и если в это время базу
+  успел изменить другой процесс, SQLite сразу отвечает «database is
+  locked», не дожидаясь ``timeout``. Немедленная блокировка ставит
+  пишущие транзакции в очередь, и они ждут её до ``timeout`` секунд.
+"""
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': -16 * 1024,
+    'mmap_size': 128 * 2 ** 20,
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', DEFAULT_PRAGMAS)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -49,7 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -63,7 +65,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'posts.metrics.TimedTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,6 +75,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'posts.context_processors.year',
+                'posts.context_processors.cache_timeout',
             ],
         },
     },
@@ -84,13 +87,65 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# База выбирается переменной окружения YATUBE_DB: 'sqlite' — файл
+# YATUBE_DB_NAME в режиме WAL (yatube.db), 'postgresql' — сервер из
+# переменных YATUBE_DB_*. Соединения живут YATUBE_DB_CONN_MAX_AGE
+# секунд и переиспользуются запросами одного потока. Перед PostgreSQL
+# обычно ставят PgBouncer: с YATUBE_DB_POOLER=pgbouncer (пул в режиме
+# transaction) серверные курсоры отключаются, так как они не переживают
+# смену соединения между транзакциями.
+DB_CONN_MAX_AGE = int(os.environ.get('YATUBE_DB_CONN_MAX_AGE', 60))
+DATABASE_BACKENDS = {
+    'sqlite': {
+        'ENGINE': 'yatube.db',
+        'NAME': os.environ.get('YATUBE_DB_NAME',
+                               os.path.join(BASE_DIR, 'db.sqlite3')),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'OPTIONS': {
+            # Сколько секунд транзакция ждёт блокировку записи
+            'timeout': float(os.environ.get('YATUBE_SQLITE_TIMEOUT', 20)),
+        },
+    },
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('YATUBE_DB_NAME', 'yatube'),
+        'USER': os.environ.get('YATUBE_DB_USER', 'yatube'),
+        'PASSWORD': os.environ.get('YATUBE_DB_PASSWORD', ''),
+        'HOST': os.environ.get('YATUBE_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('YATUBE_DB_PORT', '5432'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'DISABLE_SERVER_SIDE_CURSORS':
+            os.environ.get('YATUBE_DB_POOLER') == 'pgbouncer',
+        'OPTIONS': {
+            # Сколько целых секунд ждать соединения с сервером
+            'connect_timeout': int(
+                os.environ.get('YATUBE_PG_CONNECT_TIMEOUT', 5)),
+        },
+    },
+}
+DATABASE_ENGINE = os.environ.get('YATUBE_DB', 'sqlite')
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    'default': DATABASE_BACKENDS[DATABASE_ENGINE],
 }
 
+# Реплики для чтения лент (posts.replicas) перечисляются через запятую
+# в YATUBE_DB_REPLICAS: файлы для SQLite или хосты для PostgreSQL.
+# В тестах реплики смотрят в тестовую основную базу.
+REPLICA_DATABASES = []
+for number, replica in enumerate(
+        filter(None, os.environ.get('YATUBE_DB_REPLICAS', '').split(','))):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME' if DATABASE_ENGINE == 'sqlite' else 'HOST': replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+DATABASE_ROUTERS = ['posts.replicas.ReplicaRouter']
+# Наибольшее ожидаемое отставание реплик, секунд: столько после записи
+# пользователь читает из основной базы.
+REPLICA_MAX_LAG = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -145,8 +200,135 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Кэш выбирается переменной окружения YATUBE_CACHE: 'locmem' — свой
+# у каждого процесса, 'sqlite' — общий файл для всех воркеров
+# (yatube.sqlite_cache), путь к нему задаёт YATUBE_CACHE_LOCATION.
+# По умолчанию 'locmem' используется только с DEBUG.
+# Обёртки из posts.metrics считают попадания в кэш.
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'posts.metrics.MeteredLocMemCache',
+    },
+    'sqlite': {
+        'BACKEND': 'posts.metrics.MeteredSQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION',
+            os.path.join(BASE_DIR, 'cache', 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'CULL_FREQUENCY': 10,
+            'MMAP_SIZE': 256 * 2 ** 20,
+        },
+    },
+}
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': CACHE_BACKENDS[
+        os.environ.get('YATUBE_CACHE', 'locmem' if DEBUG else 'sqlite')],
 }
+# Число процессов сайта (WEB_CONCURRENCY, её же читает gunicorn). Кэш
+# в памяти процесса допустим только при одном процессе, иначе
+# поколения кэша (posts.cache) у воркеров расходятся: это проверяют
+# posts.checks.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# Пагинация лент: курсорная (keyset) пагинация без COUNT(*).
+# POSTS_APPROXIMATE_COUNT включает приблизительный подсчёт записей,
+# ограниченный POSTS_COUNT_LIMIT строками.
+POSTS_PER_PAGE = 10
+POSTS_APPROXIMATE_COUNT = False
+POSTS_COUNT_LIMIT = 1000
+
+# Комментарии к посту выводятся страницами по COMMENTS_PER_PAGE,
+# следующие подгружаются по курсору (posts.comments). Ответы вкладываются
+# не глубже COMMENTS_MAX_DEPTH, на странице видно COMMENTS_THREAD_DEPTH
+# уровней ветки, остальное свёрнуто.
+COMMENTS_PER_PAGE = 20
+COMMENTS_MAX_DEPTH = 10
+COMMENTS_THREAD_DEPTH = 4
+
+# Лента подписок материализуется при публикации поста. Посты авторов,
+# у которых подписчиков больше TIMELINE_FANOUT_LIMIT, подмешиваются
+# при чтении. Новому подписчику переносятся последние
+# TIMELINE_BACKFILL_LIMIT постов автора. Когда автор пересекает порог,
+# ленты его подписчиков перестраиваются в фоне после коммита; в режиме
+# отладки — сразу, как и миниатюры.
+TIMELINE_FANOUT_LIMIT = 5000
+TIMELINE_BACKFILL_LIMIT = 200
+TIMELINE_BATCH_SIZE = 500
+TIMELINE_REBALANCE_ASYNC = not DEBUG
+
+# Сколько авторов можно подписать или отписать одним запросом
+# (posts.follows).
+FOLLOW_BATCH_LIMIT = 100
+
+# Рекомендации «кого читать» (posts.suggestions): сколько хранить на
+# пользователя и с какого числа подписчиков автор считается слишком
+# популярным для поиска похожих читателей.
+SUGGESTIONS_COUNT = 10
+SUGGESTIONS_HUB_LIMIT = 1000
+
+# Фрагменты лент инвалидируются сигналами (posts.cache), поэтому
+# их можно хранить долго. Карточки постов (posts.cards) адресуются
+# версией содержимого и не инвалидируются вовсе.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+POST_CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Миниатюры картинок постов готовятся в фоновом пуле потоков
+# (posts.thumbnails). В режиме отладки они считаются сразу, чтобы
+# фоновые потоки не обращались к базе разработчика и тестов.
+THUMBNAIL_ASYNC = not DEBUG
+THUMBNAIL_WORKERS = 2
+POST_THUMBNAIL_GEOMETRY = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+
+# Варианты картинок постов для srcset/<picture> (posts.renditions).
+# Форматы, которые не умеет сохранять установленный Pillow, пропускаются.
+# RENDITION_PROCESSES = 0 кодирует картинки в вызывающем потоке.
+POST_RENDITION_WIDTHS = (320, 640, 960)
+POST_RENDITION_FORMATS = ('avif', 'webp', 'jpeg')
+POST_RENDITION_RATIO = 960 / 339
+POST_RENDITION_QUALITY = 80
+RENDITION_PROCESSES = 0 if DEBUG else os.cpu_count()
+
+# Картинки постов принимаются потоково (posts.uploads.image_uploads):
+# размер файла и разрешение проверяются по мере чтения, метаданные
+# вырезаются, а файл пишется кусками во временный каталог внутри
+# MEDIA_ROOT/posts. Остальные загрузки идут обычными обработчиками.
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+
+# Полнотекстовый поиск (posts.search). SQLiteFTSBackend работает только
+# на SQLite; InvertedIndexBackend хранит индекс в обычной таблице и
+# подходит для любой базы.
+SEARCH_BACKEND = {
+    'sqlite': 'posts.search.SQLiteFTSBackend',
+}.get(DATABASE_ENGINE, 'posts.search.InvertedIndexBackend')
+SEARCH_ADMIN_LIMIT = 1000
+
+# JSON API (posts.api): число записей на странице ленты.
+API_PAGE_SIZE = 20
+
+# Публичные страницы отдаются с ETag и Last-Modified (posts.conditional).
+# Анонимные ответы кэшируются браузерами и CDN на PUBLIC_PAGE_MAX_AGE
+# секунд, после чего перепроверяются запросом с If-None-Match.
+PUBLIC_PAGE_MAX_AGE = 0
+
+# Кэш целых страниц для анонимных посетителей (posts.pagecache).
+# Изменения данных делают страницу устаревшей сразу; устаревшая копия
+# отдаётся, пока один процесс её пересчитывает. 0 отключает кэш.
+PAGE_CACHE_TIMEOUT = 10 * 60
+PAGE_CACHE_STALE_TIMEOUT = 24 * 60 * 60
+PAGE_CACHE_LOCK_TIMEOUT = 30
+PAGE_CACHE_BETA = 1.0
+
+# Метрики запросов (posts.metrics): заголовок Server-Timing и страница
+# /metrics/ в формате Prometheus, доступная с INTERNAL_IPS и персоналу.
+# Запрос, повторившийся за один запрос к сайту столько раз, попадает в
+# лог как вероятный N+1.
+METRICS_SERVER_TIMING = True
+METRICS_REPEATED_QUERY_THRESHOLD = 5
+INTERNAL_IPS = ['127.0.0.1']
+
+# Базовый замер команды benchmark (posts.benchmark): число SQL-запросов
+# и задержки страниц, с которыми сравниваются новые замеры.
+BENCHMARK_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'baseline.json')
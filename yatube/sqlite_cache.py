@@ -0,0 +1,265 @@
+"""Кэш Django в файле SQLite, общий для всех процессов сервера.
+
+В отличие от LocMemCache, каждый воркер gunicorn видит одни и те же
+записи, а счётчики поколений (posts.cache) меняются атомарно. Файл
+открывается в режиме WAL: чтение не ждёт записи, а с ``MMAP_SIZE``
+SQLite читает страницы файла через отображение в память.
+
+Записей не больше ``MAX_ENTRIES``; при переполнении удаляются
+просроченные, затем давно не читавшиеся (LRU). Время чтения
+обновляется не чаще раза в ``ACCESS_RESOLUTION`` секунд, чтобы чтение
+не превращалось в запись. Попадания, промахи и вытеснения копятся в
+процессе и периодически сбрасываются в общую таблицу, см. ``metrics()``.
+
+Пример настройки::
+
+    CACHES = {'default': {
+        'BACKEND': 'yatube.sqlite_cache.SQLiteCache',
+        'LOCATION': '/var/cache/yatube/cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 100000, 'MMAP_SIZE': 256 * 2 ** 20},
+    }}
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL,'
+    ' expires REAL, accessed REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    'CREATE TABLE IF NOT EXISTS stats ('
+    ' name TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+)
+METRICS = ('hits', 'misses', 'sets', 'evictions')
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.mmap_size = int(options.get('MMAP_SIZE', 64 * 2 ** 20))
+        self.access_resolution = float(options.get('ACCESS_RESOLUTION', 1))
+        self.cull_every = int(options.get('CULL_EVERY', 50))
+        self.stats_interval = float(options.get('STATS_INTERVAL', 5))
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.flushed_at = time.monotonic()
+        self.sets_since_cull = 0
+
+    @property
+    def connection(self):
+        # Соединение на поток и на процесс: после fork открывается новое
+        pid = os.getpid()
+        if getattr(self.local, 'pid', None) != pid:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(f'PRAGMA mmap_size={self.mmap_size}')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self.local.connection = connection
+            self.local.pid = pid
+        return self.local.connection
+
+    def count(self, metric, amount=1):
+        with self.lock:
+            self.pending[metric] += amount
+            due = time.monotonic() - self.flushed_at >= self.stats_interval
+        if due:
+            self.flush_metrics()
+
+    def flush_metrics(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.flushed_at = time.monotonic()
+        if pending:
+            self.connection.executemany(
+                'INSERT INTO stats (name, value) VALUES (?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET value = value + ?',
+                [(name, value, value) for name, value in pending.items()])
+
+    def metrics(self):
+        """Счётчики всех процессов: hits, misses, sets, evictions, а
+        также текущее число записей ``entries``."""
+        self.flush_metrics()
+        values = dict.fromkeys(METRICS, 0)
+        values.update(self.connection.execute(
+            'SELECT name, value FROM stats').fetchall())
+        values['entries'] = self.connection.execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+        return values
+
+    def _expiry(self, timeout):
+        # Абсолютное время истечения или None для бессрочных записей
+        return self.get_backend_timeout(timeout)
+
+    def _load(self, keys):
+        """Непросроченные значения по ключам кэша (уже make_key)."""
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self.connection.execute(
+            f'SELECT key, value, expires, accessed FROM cache '
+            f'WHERE key IN ({placeholders})', keys).fetchall()
+        found, touched, expired = {}, [], []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                expired.append((key,))
+                continue
+            found[key] = pickle.loads(value)
+            if now - accessed >= self.access_resolution:
+                touched.append((now, key))
+        if touched:
+            self.connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', touched)
+        if expired:
+            self.connection.executemany(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                [(key, now) for key, in expired])
+        self.count('hits', len(found))
+        self.count('misses', len(keys) - len(found))
+        return found
+
+    def _store(self, items, timeout):
+        now = time.time()
+        expires = self._expiry(timeout)
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            [(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires,
+              now) for key, value in items])
+        self.count('sets', len(items))
+        self.sets_since_cull += len(items)
+        if self.sets_since_cull >= self.cull_every:
+            self.sets_since_cull = 0
+            self.cull()
+
+    def cull(self):
+        """Удалить просроченные записи и, если записей больше
+        MAX_ENTRIES, долю 1/CULL_FREQUENCY давно не читавшихся."""
+        connection = self.connection
+        changes = connection.total_changes
+        connection.execute('DELETE FROM cache WHERE expires <= ?',
+                           [time.time()])
+        total = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if total > self._max_entries:
+            excess = total - self._max_entries
+            if self._cull_frequency:
+                excess += self._max_entries // self._cull_frequency
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)', [excess])
+        evicted = connection.total_changes - changes
+        if evicted:
+            self.count('evictions', evicted)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._load([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        if not made:
+            return {}
+        found = self._load(list(made))
+        return {made[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._store([(key, value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            items.append((key, value))
+        if items:
+            self._store(items, timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self.connection
+        now = time.time()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                [key, now])
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                [key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 self._expiry(timeout), now])
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self.connection
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                [key]).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                [pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key])
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        cursor = self.connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self._expiry(timeout), key, time.time()])
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self.connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [key, time.time()]).fetchone() is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.connection.execute('DELETE FROM cache WHERE key = ?', [key])
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        self.connection.executemany('DELETE FROM cache WHERE key = ?',
+                                    [(key,) for key in keys])
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время работы процесса
+        pass